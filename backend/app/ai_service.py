@@ -1,14 +1,20 @@
 # AI service for document processing and intelligent chat
 import os
 import uuid
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from openai import OpenAI
+from openai import AsyncOpenAI
 import numpy as np
 from dotenv import load_dotenv
+from .config import settings
 from .database import db_manager
+from .chunker import chunker
+from .embedding_cache import embedding_cache
+from .cache import query_embedding_cache
+from .vector_index import vector_index
+from .context import RequestContext
 
 # Load environment variables
 load_dotenv()
@@ -25,11 +31,11 @@ class AIService:
             self.embeddings = None
             self.llm = None
         else:
-            self.client = OpenAI(api_key=self.openai_api_key)
+            self.client = AsyncOpenAI(api_key=self.openai_api_key, base_url=settings.openai_base_url)
             # Use cheapest embedding model
             self.embeddings = OpenAIEmbeddings(
                 api_key=self.openai_api_key,
-                model="text-embedding-3-small"  # Cheapest embedding option
+                model=settings.embedding_model  # Cheapest embedding option
             )
             self.llm = ChatOpenAI(
                 api_key=self.openai_api_key,
@@ -38,44 +44,54 @@ class AIService:
                 max_tokens=200  # Further reduced to save costs
             )
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,   # Reduced from 1000 to save on embedding costs
-            chunk_overlap=150, # Reduced from 200
-            length_function=len,
-        )
+        # Bound the number of in-flight OpenAI requests per worker
+        self.openai_semaphore = asyncio.Semaphore(settings.openai_max_connections)
+        # Streaming chat completions, bounded separately from embeddings and plain completions
+        self.stream_semaphore = asyncio.Semaphore(settings.openai_max_streams)
+        
+        # Splits along page/slide/sheet structure and counts tokens
+        self.chunker = chunker
 
-    async def process_document_content(self, content: str, document_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    async def process_document_content(
+        self,
+        content: str,
+        document_id: str,
+        metadata: Dict[str, Any],
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
         """Process document content into chunks with embeddings"""
         try:
             logger.info(f"Processing document {document_id} with {len(content)} characters")
             
-            # Split content into chunks
-            chunks = self.text_splitter.split_text(content)
-            logger.info(f"Created {len(chunks)} chunks for document {document_id}")
+            # Split content into token-sized chunks along document structure
+            chunks = list(self.chunker.iter_chunks(content))
+            logger.info(f"Created {len(chunks)} chunks ({sum(c['token_count'] for c in chunks)} tokens) for document {document_id}")
             
-            processed_chunks = 0
+            # Embed all chunks in as few requests as the batch budget allows
+            embeddings = await self.create_embeddings(
+                [chunk["content"] for chunk in chunks],
+                progress_callback=progress_callback
+            )
             
-            for i, chunk in enumerate(chunks):
-                if not chunk.strip():
-                    continue
-                
-                # Create embedding for the chunk
-                embedding = await self.create_embedding(chunk)
-                
-                # Save chunk to database using database manager
-                chunk_data = {
+            chunk_rows = []
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+                chunk_rows.append({
                     "id": str(uuid.uuid4()),
                     "document_id": document_id,
-                    "content": chunk,
+                    "content": chunk["content"],
                     "chunk_index": i,
+                    "token_count": chunk["token_count"],
                     "embedding": embedding,
-                    "metadata": {**metadata, "chunk_index": i}
-                }
-                
-                result = await db_manager.create_document_chunk(chunk_data)
-                if result:
-                    processed_chunks += 1
-                    logger.debug(f"Saved chunk {i+1}/{len(chunks)} for document {document_id}")
+                    "metadata": {**metadata, "chunk_index": i, "sections": chunk["sections"]}
+                })
+            
+            # Bulk insert chunk rows
+            saved_chunks = await db_manager.create_document_chunks(chunk_rows)
+            processed_chunks = len(saved_chunks)
+            if processed_chunks != len(chunk_rows):
+                # A partly indexed document would silently miss search results
+                await db_manager.clear_document_chunks(document_id)
+                raise RuntimeError(f"Only {processed_chunks} of {len(chunk_rows)} chunks could be saved")
             
             logger.info(f"Successfully processed {processed_chunks} chunks for document {document_id}")
             
@@ -94,6 +110,94 @@ class AIService:
                 "document_id": document_id
             }
 
+    def _batch_texts(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches that fit the embedding request budget"""
+        batches = []
+        current_batch = []
+        current_tokens = 0
+        
+        for i, text in enumerate(texts):
+            tokens = self.chunker.count_tokens(text)
+            if current_batch and (
+                len(current_batch) >= settings.embedding_batch_size
+                or current_tokens + tokens > settings.embedding_batch_max_tokens
+            ):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(i)
+            current_tokens += tokens
+        
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> List[List[float]]:
+        """Create embeddings for many texts, using the cache and batched OpenAI requests"""
+        if not texts:
+            return []
+        
+        if not self.client:
+            logger.warning("OpenAI client not available, returning mock embeddings")
+            return [[0.0] * 1536 for _ in texts]
+        
+        # Reuse embeddings for chunks we've already seen
+        keys = [embedding_cache.make_key(settings.embedding_model, text) for text in texts]
+        cached = await embedding_cache.get_many(keys)
+        embeddings: List[List[float]] = [cached.get(key) for key in keys]
+        
+        # Embed each distinct uncached text once
+        pending: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if embeddings[i] is None:
+                pending.setdefault(key, []).append(i)
+        pending_keys = list(pending)
+        pending_texts = [texts[pending[key][0]] for key in pending_keys]
+        
+        embedded_count = len(texts) - sum(len(indices) for indices in pending.values())
+        if embedded_count:
+            logger.info(f"Embedding cache hit for {embedded_count}/{len(texts)} texts")
+        
+        new_embeddings: Dict[str, List[float]] = {}
+        batches = self._batch_texts(pending_texts)
+        
+        try:
+            for batch_num, batch in enumerate(batches, 1):
+                try:
+                    async with self.openai_semaphore:
+                        response = await self.client.embeddings.create(
+                            model=settings.embedding_model,
+                            input=[pending_texts[i].replace("\n", " ") for i in batch]
+                        )
+                except Exception as e:
+                    logger.error(f"Error creating embeddings for batch {batch_num}/{len(batches)}: {str(e)}")
+                    # Zero vectors would be stored as chunks search can never find; fail the document instead
+                    raise RuntimeError(f"Embedding batch {batch_num}/{len(batches)} failed: {e}") from e
+                
+                # Results carry their input position, which may not match response order
+                for item in response.data:
+                    key = pending_keys[batch[item.index]]
+                    new_embeddings[key] = item.embedding
+                    for i in pending[key]:
+                        embeddings[i] = item.embedding
+                logger.debug(f"Embedded batch {batch_num}/{len(batches)} ({len(batch)} texts)")
+                
+                embedded_count += sum(len(pending[pending_keys[i]]) for i in batch)
+                if progress_callback:
+                    progress_callback(embedded_count, len(texts))
+        finally:
+            # Keep finished batches, so a retry only pays for the rest
+            await embedding_cache.put_many(new_embeddings)
+        
+        missing = sum(embedding is None for embedding in embeddings)
+        if missing:
+            raise RuntimeError(f"Embeddings missing for {missing}/{len(texts)} texts")
+        return embeddings
+
     async def create_embedding(self, text: str) -> List[float]:
         """Create embedding for text using OpenAI"""
         try:
@@ -102,77 +206,210 @@ class AIService:
                 # Return a mock embedding vector of dimension 1536
                 return [0.0] * 1536
             
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text.replace("\n", " ")
-            )
+            async with self.openai_semaphore:
+                response = await self.client.embeddings.create(
+                    model=settings.embedding_model,
+                    input=text.replace("\n", " ")
+                )
             return response.data[0].embedding
         except Exception as e:
             logger.error(f"Error creating embedding: {str(e)}")
             # Return mock embedding on error
             return [0.0] * 1536
 
+    async def embed_query(self, query: str) -> List[float]:
+        """Create embedding for a search query, reusing recent results"""
+        key = query_embedding_cache.make_key(settings.embedding_model, query)
+        embedding = await query_embedding_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = await self.create_embedding(query)
+        # Don't cache the mock embedding returned on errors
+        if any(embedding):
+            await query_embedding_cache.set(key, embedding)
+        return embedding
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Create embeddings for several search queries in one request, reusing recent results"""
+        keys = [query_embedding_cache.make_key(settings.embedding_model, query) for query in queries]
+        embeddings = [await query_embedding_cache.get(key) for key in keys]
+        
+        missing: Dict[str, str] = {}
+        for key, query, embedding in zip(keys, queries, embeddings):
+            if embedding is None:
+                missing.setdefault(key, query)
+        if not missing:
+            return embeddings
+        
+        new_embeddings: Dict[str, List[float]] = {}
+        if not self.client:
+            logger.warning("OpenAI client not available, returning mock embeddings")
+        else:
+            missing_keys = list(missing)
+            try:
+                async with self.openai_semaphore:
+                    response = await self.client.embeddings.create(
+                        model=settings.embedding_model,
+                        input=[missing[key].replace("\n", " ") for key in missing_keys]
+                    )
+                for item in response.data:
+                    new_embeddings[missing_keys[item.index]] = item.embedding
+            except Exception as e:
+                logger.error(f"Error creating query embeddings: {str(e)}")
+        
+        for key, embedding in new_embeddings.items():
+            await query_embedding_cache.set(key, embedding)
+        
+        # Mock embedding for anything that failed
+        return [
+            embedding if embedding is not None else new_embeddings.get(key, [0.0] * 1536)
+            for key, embedding in zip(keys, embeddings)
+        ]
+
+    async def vector_search_many(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        match_threshold: float = 0.7
+    ) -> List[List[Dict[str, Any]]]:
+        """Search chunks for several embeddings at once using the configured backend"""
+        if settings.vector_search_backend == "local":
+            # Searches wait on the index lock while a sync appends, so keep them off the event loop
+            return await asyncio.to_thread(vector_index.search_many, query_embeddings, limit, match_threshold)
+        return await db_manager.vector_search_chunks_multi(query_embeddings, limit, match_threshold)
+
+    async def vector_search(self, query_embedding: List[float], limit: int = 5, match_threshold: float = 0.7) -> List[Dict[str, Any]]:
+        """Search chunks by embedding using the configured backend"""
+        if settings.vector_search_backend == "local":
+            return await asyncio.to_thread(vector_index.search, query_embedding, limit, match_threshold)
+        return await db_manager.vector_search_chunks(query_embedding, limit, match_threshold)
+
+    @staticmethod
+    def _format_chunk(chunk: Dict[str, Any], similarity: float) -> Dict[str, Any]:
+        """Shape a vector or keyword search hit the way callers expect"""
+        return {
+            "id": chunk["id"],
+            "document_id": chunk["document_id"],
+            "content": chunk["content"],
+            "metadata": chunk.get("metadata", {}),
+            "document_title": chunk.get("document_title", "Unknown"),
+            "file_type": chunk.get("document_file_type", "unknown"),
+            "similarity": similarity
+        }
+
+    @staticmethod
+    def _reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Merge ranked hit lists with reciprocal rank fusion
+
+        Each list contributes 1 / (rrf_k + rank) per chunk. The fused score is divided by
+        the best achievable score (first in every list), so it falls in (0, 1] and means
+        the same thing for every query. Empty lists are left out, so a search that found
+        nothing doesn't halve the scores of the one that did.
+        """
+        rankings = [ranking for ranking in rankings if ranking]
+        if not rankings:
+            return []
+        fused: Dict[str, Dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, chunk in enumerate(ranking, 1):
+                entry = fused.setdefault(chunk["id"], {"chunk": chunk, "score": 0.0})
+                entry["score"] += 1 / (settings.rrf_k + rank)
+
+        best_score = len(rankings) / (settings.rrf_k + 1)
+        ordered = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+        return [
+            AIService._format_chunk(entry["chunk"], round(entry["score"] / best_score, 4))
+            for entry in ordered[:limit]
+        ]
+
+    async def _vector_search_query(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Embed a query and run vector search, returning no hits if either step fails"""
+        try:
+            query_embedding = await self.embed_query(query)
+            return await self.vector_search(query_embedding, limit)
+        except Exception as e:
+            logger.warning(f"Vector search failed: {str(e)}")
+            return []
+
+    async def hybrid_search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Run vector and keyword search concurrently and fuse the rankings"""
+        candidates = max(limit, settings.hybrid_candidates)
+        vector_chunks, keyword_chunks = await asyncio.gather(
+            self._vector_search_query(query, candidates),
+            db_manager.search_document_chunks(query, candidates)
+        )
+        chunks = self._reciprocal_rank_fusion([vector_chunks, keyword_chunks], limit)
+        logger.info(
+            f"Found {len(chunks)} chunks via hybrid search ({len(vector_chunks)} vector, "
+            f"{len(keyword_chunks)} keyword candidates) for query: {query[:50]}..."
+        )
+        return chunks
+
+    async def search_many(self, queries: List[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for chunks relevant to any of several queries
+
+        All queries are embedded in one request and vector-searched in one call; keyword
+        searches (hybrid mode) run alongside. Every ranking is fused, so a chunk found by
+        several queries appears once, ranked higher.
+        """
+        queries = [query for query in queries if query and query.strip()]
+        if not queries:
+            return []
+        try:
+            candidates = max(limit, settings.hybrid_candidates)
+            
+            async def vector_rankings() -> List[List[Dict[str, Any]]]:
+                if not self.client:
+                    return []
+                try:
+                    query_embeddings = await self.embed_queries(queries)
+                    return await self.vector_search_many(query_embeddings, candidates)
+                except Exception as e:
+                    logger.warning(f"Multi-query vector search failed: {str(e)}")
+                    return []
+            
+            def keyword_searches():
+                return [db_manager.search_document_chunks(query, candidates) for query in queries]
+            
+            use_keywords = settings.retrieval_mode == "hybrid" or not self.client
+            vector_results, *keyword_results = await asyncio.gather(
+                vector_rankings(),
+                *(keyword_searches() if use_keywords else [])
+            )
+            rankings = [ranking for ranking in list(vector_results) + keyword_results if ranking]
+            if not rankings and not use_keywords:
+                # Vector-only mode falls back to keyword search when vectors find nothing
+                keyword_results = await asyncio.gather(*keyword_searches())
+                rankings = [ranking for ranking in keyword_results if ranking]
+            
+            chunks = self._reciprocal_rank_fusion(rankings, limit)
+            logger.info(f"Found {len(chunks)} chunks via multi-query search for {len(queries)} queries")
+            return chunks
+        
+        except Exception as e:
+            logger.error(f"Error in multi-query search: {str(e)}")
+            return []
+
     async def search_similar_chunks(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar document chunks using vector embeddings with text search fallback"""
+        """Search for relevant document chunks: hybrid retrieval, or vector search with keyword fallback"""
         try:
+            if self.client and settings.retrieval_mode == "hybrid":
+                return await self.hybrid_search(query, limit)
+            
             # First try vector similarity search if we have OpenAI client
             if self.client:
-                try:
-                    # Create query embedding
-                    query_embedding = await self.create_embedding(query)
-                    
-                    # Use vector similarity search through database manager
-                    chunks = await db_manager.vector_search_chunks(query_embedding, limit)
-                    
-                    if chunks:
-                        # Format results for consistency
-                        formatted_chunks = []
-                        for chunk in chunks:
-                            formatted_chunks.append({
-                                "id": chunk["id"],
-                                "document_id": chunk["document_id"],
-                                "content": chunk["content"],
-                                "metadata": chunk.get("metadata", {}),
-                                "document_title": chunk.get("document_title", "Unknown"),
-                                "file_type": chunk.get("document_file_type", "unknown"),
-                                "similarity": chunk.get("similarity", 0.0)
-                            })
-                        
-                        logger.info(f"Found {len(formatted_chunks)} similar chunks via vector search for query: {query[:50]}...")
-                        return formatted_chunks
-                except Exception as vector_error:
-                    logger.warning(f"Vector search failed: {str(vector_error)}, falling back to text search")
-            
-            # Fallback to text search with multiple search terms
-            logger.info(f"Using text search fallback for query: {query[:50]}...")
-            text_chunks = []
+                chunks = await self._vector_search_query(query, limit)
+                if chunks:
+                    logger.info(f"Found {len(chunks)} similar chunks via vector search for query: {query[:50]}...")
+                    return [self._format_chunk(chunk, chunk.get("similarity", 0.0)) for chunk in chunks]
             
-            # Try the original query first
+            # Fallback to ranked keyword search; any query term can match
+            logger.info(f"Using text search fallback for query: {query[:50]}...")
             text_chunks = await db_manager.search_document_chunks(query, limit)
-            
-            # If no results, try individual words from the query
-            if not text_chunks and len(query.split()) > 1:
-                for word in query.split():
-                    if len(word) > 2:  # Only search for words longer than 2 characters
-                        word_chunks = await db_manager.search_document_chunks(word, limit)
-                        text_chunks.extend(word_chunks)
-                        if len(text_chunks) >= limit:
-                            text_chunks = text_chunks[:limit]
-                            break
-            
-            # Format text search results to match vector search format
-            formatted_chunks = []
-            for chunk in text_chunks:
-                doc_info = chunk.get("documents", {})
-                formatted_chunks.append({
-                    "id": chunk["id"],
-                    "document_id": chunk["document_id"], 
-                    "content": chunk["content"],
-                    "metadata": chunk.get("metadata", {}),
-                    "document_title": doc_info.get("title", "Unknown") if doc_info else "Unknown",
-                    "file_type": doc_info.get("file_type", "unknown") if doc_info else "unknown",
-                    "similarity": 0.8  # Default similarity for text search
-                })
+            formatted_chunks = [self._format_chunk(chunk, chunk.get("rank", 0.0)) for chunk in text_chunks]
             
             logger.info(f"Found {len(formatted_chunks)} chunks via text search for query: {query[:50]}...")
             return formatted_chunks
@@ -181,64 +418,69 @@ class AIService:
             logger.error(f"Error in all search methods: {str(e)}")
             return []
 
-    async def generate_chat_response(self, user_message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate intelligent chat response using OpenAI and document context"""
-        try:
-            logger.info(f"Generating chat response for user message: {user_message[:100]}...")
-            
-            # Search for relevant document chunks (reduced limit to save costs)
-            relevant_chunks = await self.search_similar_chunks(user_message, limit=2)
-            
-            # Get user's assignments for additional context
-            user_id = user_context.get("user_id")
-            assignments = []
-            documents = []
-            
-            if user_id:
-                assignments = await db_manager.get_user_assignments(user_id)
-                documents = await db_manager.get_user_documents(user_id)
-            
-            # Build context for the AI
-            context_parts = []
-            
-            # Add document context if available
-            if relevant_chunks:
-                context_parts.append("RELEVANT DOCUMENTS:")
-                for i, chunk in enumerate(relevant_chunks, 1):
-                    context_parts.append(f"{i}. From '{chunk['document_title']}': {chunk['content'][:300]}...")
-                context_parts.append("")
-            
-            # Add user context
-            if assignments:
-                context_parts.append(f"USER HAS {len(assignments)} ASSIGNMENTS:")
-                for assignment in assignments[:5]:  # Show top 5
-                    status = assignment.get("status", "unknown")
-                    title = assignment.get("title", "Unknown")
-                    due_date = assignment.get("due_date", "No due date")
-                    priority = assignment.get("priority", "medium")
-                    progress = assignment.get("progress", 0)
-                    description = assignment.get("description", "No description")[:100]
-                    
-                    context_parts.append(f"- **{title}** ({status})")
-                    context_parts.append(f"  Priority: {priority} | Progress: {progress}% | Due: {due_date}")
-                    if description != "No description":
-                        context_parts.append(f"  Description: {description}...")
-                context_parts.append("")
-            
-            if documents:
-                context_parts.append(f"USER HAS {len(documents)} DOCUMENTS AVAILABLE:")
-                for doc in documents[:5]:  # Show top 5
-                    title = doc.get("title", "Unknown document")
-                    file_type = doc.get("file_type", "unknown")
-                    created_at = doc.get("created_at", "unknown date")[:10]  # Just date part
-                    file_size = doc.get("file_size", 0)
-                    
-                    size_kb = round(file_size / 1024, 1) if file_size else "Unknown"
-                    context_parts.append(f"- **{title}** ({file_type}) - {size_kb}KB, uploaded {created_at}")
-                context_parts.append("")
-            
-            # Build the prompt
-            system_prompt = """You are an AI assistant for a SharePoint document management platform. You help users with:
+    def request_context(self, user_id: Optional[str]) -> RequestContext:
+        """Create a request-scoped loader that searches with this service"""
+        return RequestContext(user_id, self.search_similar_chunks, self.search_many)
+
+    async def _build_chat_prompt(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        context: Optional[RequestContext] = None
+    ) -> Dict[str, Any]:
+        """Gather document and user context and build the chat prompt"""
+        user_id = user_context.get("user_id")
+        context = context or self.request_context(user_id)
+
+        # Search for relevant document chunks (reduced limit to save costs) while
+        # the user's assignments and documents load
+        relevant_chunks, assignments, documents = await asyncio.gather(
+            context.search(user_message, 2),
+            context.assignments(),
+            context.documents()
+        )
+
+        # Build context for the AI
+        context_parts = []
+
+        # Add document context if available
+        if relevant_chunks:
+            context_parts.append("RELEVANT DOCUMENTS:")
+            for i, chunk in enumerate(relevant_chunks, 1):
+                context_parts.append(f"{i}. From '{chunk['document_title']}': {chunk['content'][:300]}...")
+            context_parts.append("")
+
+        # Add user context
+        if assignments:
+            context_parts.append(f"USER HAS {len(assignments)} ASSIGNMENTS:")
+            for assignment in assignments[:5]:  # Show top 5
+                status = assignment.get("status", "unknown")
+                title = assignment.get("title", "Unknown")
+                due_date = assignment.get("due_date", "No due date")
+                priority = assignment.get("priority", "medium")
+                progress = assignment.get("progress", 0)
+                description = assignment.get("description", "No description")[:100]
+                
+                context_parts.append(f"- **{title}** ({status})")
+                context_parts.append(f"  Priority: {priority} | Progress: {progress}% | Due: {due_date}")
+                if description != "No description":
+                    context_parts.append(f"  Description: {description}...")
+            context_parts.append("")
+
+        if documents:
+            context_parts.append(f"USER HAS {len(documents)} DOCUMENTS AVAILABLE:")
+            for doc in documents[:5]:  # Show top 5
+                title = doc.get("title", "Unknown document")
+                file_type = doc.get("file_type", "unknown")
+                created_at = doc.get("created_at", "unknown date")[:10]  # Just date part
+                file_size = doc.get("file_size", 0)
+                
+                size_kb = round(file_size / 1024, 1) if file_size else "Unknown"
+                context_parts.append(f"- **{title}** ({file_type}) - {size_kb}KB, uploaded {created_at}")
+            context_parts.append("")
+
+        # Build the prompt
+        system_prompt = """You are an AI assistant for a SharePoint document management platform. You help users with:
 1. Finding information in their documents
 2. Managing assignments and tasks
 3. Organizing their work
@@ -251,56 +493,79 @@ IMPORTANT INSTRUCTIONS:
 - When users ask about document names: List the actual document titles from the context
 - Be helpful, concise, and specific. Always use the provided context data.
 - If context shows "No specific documents or context available", then say you don't have access to the data."""
-            context_text = "\n".join(context_parts) if context_parts else "No specific documents or context available."
-            
-            # Debug: Log the context being sent to AI
-            logger.info(f"AI Context for user {user_id}: {context_text[:500]}...")
-            
-            user_prompt = f"""Context:
+        context_text = "\n".join(context_parts) if context_parts else "No specific documents or context available."
+
+        # Debug: Log the context being sent to AI
+        logger.info(f"AI Context for user {user_id}: {context_text[:500]}...")
+
+        user_prompt = f"""Context:
 {context_text}
 
 User Question: {user_message}
 
 Please provide a helpful response based on the available context and documents."""
+
+        # Prepare sources information
+        sources = []
+        for chunk in relevant_chunks:
+            sources.append({
+                "document_title": chunk["document_title"],
+                "content_preview": chunk["content"][:150] + "...",
+                "file_type": chunk["file_type"]
+            })
+
+        return {
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "sources": sources,
+            "context_used": {
+                "documents_found": len(relevant_chunks),
+                "assignments_count": len(assignments),
+                "total_documents": len(documents)
+            },
+            "confidence": "high" if relevant_chunks else "medium"
+        }
+
+    @staticmethod
+    def _fallback_chat_response(user_message: str) -> str:
+        return f"I understand you're asking: '{user_message}'. However, I'm currently running in fallback mode without AI capabilities. Please check the OpenAI API key configuration."
+
+    async def generate_chat_response(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        context: Optional[RequestContext] = None
+    ) -> Dict[str, Any]:
+        """Generate intelligent chat response using OpenAI and document context"""
+        try:
+            logger.info(f"Generating chat response for user message: {user_message[:100]}...")
+            
+            prompt = await self._build_chat_prompt(user_message, user_context, context)
             
             # Generate response using OpenAI
             if not self.client:
                 logger.warning("OpenAI client not available, returning fallback response")
-                ai_response = f"I understand you're asking: '{user_message}'. However, I'm currently running in fallback mode without AI capabilities. Please check the OpenAI API key configuration."
+                ai_response = self._fallback_chat_response(user_message)
             else:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    max_tokens=800,
-                    temperature=0.7
-                )
+                async with self.openai_semaphore:
+                    response = await self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=prompt["messages"],
+                        max_tokens=800,
+                        temperature=0.7
+                    )
                 ai_response = response.choices[0].message.content
             
-            # Prepare sources information
-            sources = []
-            if relevant_chunks:
-                for chunk in relevant_chunks:
-                    sources.append({
-                        "document_title": chunk["document_title"],
-                        "content_preview": chunk["content"][:150] + "...",
-                        "file_type": chunk["file_type"]
-                    })
-            
             result = {
                 "response": ai_response,
-                "sources": sources,
-                "context_used": {
-                    "documents_found": len(relevant_chunks),
-                    "assignments_count": len(assignments),
-                    "total_documents": len(documents)
-                },
-                "confidence": "high" if relevant_chunks else "medium"
+                "sources": prompt["sources"],
+                "context_used": prompt["context_used"],
+                "confidence": prompt["confidence"]
             }
             
-            logger.info(f"Generated response with {len(sources)} sources")
+            logger.info(f"Generated response with {len(prompt['sources'])} sources")
             return result
             
         except Exception as e:
@@ -312,10 +577,76 @@ Please provide a helpful response based on the available context and documents."
                 "confidence": "low"
             }
 
-    async def get_chat_suggestions(self, user_context: Dict[str, Any]) -> List[str]:
+    async def stream_chat_response(
+        self,
+        user_message: str,
+        user_context: Dict[str, Any],
+        context: Optional[RequestContext] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat response as it is generated
+
+        Yields {"type": "token"} events as the model produces text, then one {"type": "done"}
+        event with the full response, sources and context used, or {"type": "error"} on failure.
+        Closing the generator early closes the upstream completion.
+        """
+        logger.info(f"Streaming chat response for user message: {user_message[:100]}...")
+        response_parts = []
+        try:
+            prompt = await self._build_chat_prompt(user_message, user_context, context)
+            
+            if not self.client:
+                logger.warning("OpenAI client not available, returning fallback response")
+                fallback = self._fallback_chat_response(user_message)
+                response_parts.append(fallback)
+                yield {"type": "token", "content": fallback}
+            else:
+                # Streams stay open for the client's read time, so they don't take shared OpenAI slots
+                async with self.stream_semaphore:
+                    stream = await self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=prompt["messages"],
+                        max_tokens=800,
+                        temperature=0.7,
+                        stream=True
+                    )
+                    try:
+                        async for event in stream:
+                            if not event.choices:
+                                continue
+                            token = event.choices[0].delta.content
+                            if token:
+                                response_parts.append(token)
+                                yield {"type": "token", "content": token}
+                    finally:
+                        # Dropping the connection stops generation (and billing) for abandoned answers
+                        await stream.close()
+            
+            logger.info(f"Streamed response with {len(prompt['sources'])} sources")
+            yield {
+                "type": "done",
+                "response": "".join(response_parts),
+                "sources": prompt["sources"],
+                "context_used": prompt["context_used"],
+                "confidence": prompt["confidence"]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            yield {
+                "type": "error",
+                "message": f"I apologize, but I encountered an error processing your request: {str(e)}"
+            }
+
+    async def get_chat_suggestions(
+        self,
+        user_context: Dict[str, Any],
+        context: Optional[RequestContext] = None
+    ) -> List[str]:
         """Generate contextual chat suggestions based on user's data"""
         try:
             user_id = user_context.get("user_id")
+            context = context or self.request_context(user_id)
             suggestions = [
                 "What documents do I have?",
                 "Help me organize my work",
@@ -323,16 +654,15 @@ Please provide a helpful response based on the available context and documents."
             ]
             
             if user_id:
-                # Get user's assignments and documents
-                assignments = await db_manager.get_user_assignments(user_id)
-                documents = await db_manager.get_user_documents(user_id)
+                # Get user's assignment counts and documents
+                stats, documents = await asyncio.gather(context.assignment_stats(), context.documents())
                 
-                if assignments:
-                    pending_count = len([a for a in assignments if a.get("status") == "todo"])
+                if stats:
+                    pending_count = stats["pending_assignments"]
                     if pending_count > 0:
                         suggestions.append(f"Show me my {pending_count} pending assignments")
                     
-                    in_progress_count = len([a for a in assignments if a.get("status") == "in-progress"])
+                    in_progress_count = stats["in_progress_assignments"]
                     if in_progress_count > 0:
                         suggestions.append(f"What's the status of my {in_progress_count} active tasks?")
                 
@@ -353,15 +683,16 @@ Please provide a helpful response based on the available context and documents."
                 "Help me find documents"
             ]
 
-    async def generate_assignment_insights(self, assignment_data: Dict[str, Any], user_context: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_assignment_insights(
+        self,
+        assignment_data: Dict[str, Any],
+        user_context: Dict[str, Any],
+        context: Optional[RequestContext] = None
+    ) -> Dict[str, Any]:
         """Generate AI insights for a specific assignment including document suggestions and timeline"""
         try:
             user_id = user_context.get("user_id")
-            
-            # Get user's documents for matching
-            documents = []
-            if user_id:
-                documents = await db_manager.get_user_documents(user_id)
+            context = context or self.request_context(user_id)
             
             # Search for relevant document chunks based on assignment content
             search_queries = []
@@ -369,12 +700,13 @@ Please provide a helpful response based on the available context and documents."
                 search_queries.append(assignment_data["title"])
             if assignment_data.get("description"):
                 search_queries.append(assignment_data["description"])
+            search_queries = [query for query in search_queries if query and len(query.strip()) > 3]
             
-            relevant_chunks = []
-            for query in search_queries:
-                if query and len(query.strip()) > 3:
-                    chunks = await self.search_similar_chunks(query, limit=3)
-                    relevant_chunks.extend(chunks)
+            # Get user's documents for matching while one batched search covers every query
+            documents, relevant_chunks = await asyncio.gather(
+                context.documents(),
+                context.search_many(search_queries, 3 * max(len(search_queries), 1))
+            )
             
             # Remove duplicates
             seen_doc_ids = set()
@@ -454,15 +786,16 @@ Focus on being practical and specific to this assignment."""
                 # Fallback response when OpenAI is not available
                 return self._generate_fallback_insights(assignment_data, unique_chunks, documents)
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
+            async with self.openai_semaphore:
+                response = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=1000,
+                    temperature=0.7
+                )
             
             ai_response = response.choices[0].message.content
             
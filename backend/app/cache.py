@@ -0,0 +1,180 @@
+# In-process caches with TTL and LRU eviction
+import hashlib
+import logging
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a fixed time"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, or None if missing or expired"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any):
+        """Cache a value, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Drop a cached value"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all cached values"""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class QueryEmbeddingCache:
+    """Cache of search query embeddings, optionally shared across workers through Redis"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, redis_url: Optional[str] = None):
+        self.local = TTLCache(max_entries, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.shared_hits = 0
+        self.redis = None
+        if redis_url:
+            try:
+                import redis.asyncio as redis
+                self.redis = redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("redis package not installed, query embedding cache is process-local only")
+
+    @staticmethod
+    def make_key(model: str, query: str) -> str:
+        """Build the cache key from the model name and a hash of the normalized query"""
+        normalized = " ".join(query.split())
+        return f"query_embedding:{model}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        """Look up a query embedding locally, then in the shared backend"""
+        embedding = self.local.get(key)
+        if embedding is not None or self.redis is None:
+            return embedding
+        try:
+            blob = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Shared query embedding cache unavailable: {e}")
+            return None
+        if blob is None:
+            return None
+        vector = array("f")
+        vector.frombytes(blob)
+        embedding = vector.tolist()
+        self.shared_hits += 1
+        self.local.set(key, embedding)
+        return embedding
+
+    async def set(self, key: str, embedding: List[float]):
+        """Store a query embedding locally and in the shared backend"""
+        self.local.set(key, embedding)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(key, array("f", embedding).tobytes(), ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Shared query embedding cache unavailable: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for sizing the cache"""
+        stats = self.local.stats()
+        stats["shared_backend"] = "redis" if self.redis is not None else None
+        stats["shared_hits"] = self.shared_hits
+        return stats
+
+class UserCache:
+    """Short-lived cache of user rows for authentication, looked up by ID or email"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.users = TTLCache(max_entries, ttl_seconds)
+        # Email lookups resolve through the ID, so invalidating the ID covers both
+        self.ids_by_email = TTLCache(max_entries, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a cached user by ID"""
+        return self._count(self.users.get(user_id))
+
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get a cached user by email"""
+        user_id = self.ids_by_email.get(email)
+        return self._count(self.users.get(user_id) if user_id is not None else None)
+
+    def set(self, user: Dict[str, Any]):
+        """Cache a user row"""
+        self.users.set(user["id"], user)
+        if user.get("email"):
+            self.ids_by_email.set(user["email"], user["id"])
+
+    def invalidate(self, user_id: str):
+        """Drop a cached user"""
+        self.users.invalidate(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit/miss counters for user lookups"""
+        stats = self.users.stats()
+        lookups = self.hits + self.misses
+        stats.update({
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        })
+        return stats
+
+# Global user cache instance
+user_cache = UserCache(settings.user_cache_max_entries, settings.user_cache_ttl_seconds)
+
+# Global cache of document file metadata for downloads, keyed by document ID
+document_file_cache = TTLCache(settings.document_file_cache_max_entries, settings.document_file_cache_ttl_seconds)
+
+# Global query embedding cache instance
+query_embedding_cache = QueryEmbeddingCache(
+    settings.query_cache_max_entries,
+    settings.query_cache_ttl_seconds,
+    settings.redis_url
+)
@@ -0,0 +1,164 @@
+# Token-aware chunker that follows the structure DocumentProcessor emits
+import logging
+import re
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Section headers written by DocumentProcessor, e.g. "=== Page 3 ===", "=== Slide 2 ===", "=== Sheet: Q1 ==="
+SECTION_MARKER = re.compile(r"^=== (.+) ===$", re.MULTILINE)
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+class StructuredChunker:
+    """Splits extracted text along page/slide/sheet/paragraph boundaries into token-sized chunks"""
+
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = None
+        if tiktoken:
+            try:
+                self.tokenizer = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens in text, estimating when tiktoken is not available"""
+        if self.tokenizer:
+            return len(self.tokenizer.encode(text, disallowed_special=()))
+        return max(1, len(text) // 4)
+
+    def _iter_sections(self, text: str) -> Iterator[Tuple[Optional[str], str]]:
+        """Yield (header, body) for each marked section; text before the first marker has no header"""
+        position = 0
+        header = None
+        for match in SECTION_MARKER.finditer(text):
+            body = text[position:match.start()]
+            if body.strip() or header:
+                yield header, body
+            header = match.group(0)
+            position = match.end()
+        yield header, text[position:]
+
+    def _split_oversized(self, paragraph: str, budget: int) -> Iterator[str]:
+        """Split a paragraph that alone exceeds the token budget, by sentence and then by token"""
+        piece = ""
+        for sentence in SENTENCE_BREAK.split(paragraph):
+            candidate = f"{piece} {sentence}" if piece else sentence
+            if self.count_tokens(candidate) <= budget:
+                piece = candidate
+                continue
+            if piece:
+                yield piece
+            if self.count_tokens(sentence) <= budget:
+                piece = sentence
+                continue
+            # A single sentence over budget: hard split on token boundaries
+            if self.tokenizer:
+                tokens = self.tokenizer.encode(sentence, disallowed_special=())
+                for start in range(0, len(tokens), budget):
+                    yield self.tokenizer.decode(tokens[start:start + budget])
+            else:
+                width = budget * 4
+                for start in range(0, len(sentence), width):
+                    yield sentence[start:start + width]
+            piece = ""
+        if piece:
+            yield piece
+
+    def _iter_blocks(self, text: str) -> Iterator[Tuple[Optional[str], str, int, bool]]:
+        """Yield (section header, paragraph, tokens, starts_section) for every paragraph
+
+        Paragraphs are split small enough to share a chunk with their section header.
+        """
+        for header, body in self._iter_sections(text):
+            budget = self.max_tokens
+            if header:
+                # Leave room for the header and the newline joining it to the paragraph
+                budget = max(1, budget - self.count_tokens(header) - 1)
+            first = True
+            for line in body.split("\n"):
+                line = line.strip()
+                if not line:
+                    continue
+                tokens = self.count_tokens(line)
+                pieces = [line] if tokens <= budget else list(self._split_oversized(line, budget))
+                for piece in pieces:
+                    yield header, piece, tokens if len(pieces) == 1 else self.count_tokens(piece), first
+                    first = False
+
+    def _fits(self, blocks: List[str]) -> bool:
+        """Whether blocks joined into one chunk stay within max_tokens"""
+        return self.count_tokens("\n".join(blocks)) <= self.max_tokens
+
+    def iter_chunks(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream chunks of at most max_tokens tokens
+
+        Paragraphs are packed greedily, so small pages, slides and sheets share a chunk.
+        A cut at a section boundary starts the next chunk clean; a cut inside a section
+        repeats the section header and carries up to overlap_tokens of trailing paragraphs.
+        The budget is checked against the joined chunk text, headers and newlines included.
+        """
+        blocks: List[str] = []
+        block_tokens: List[int] = []
+        sections: List[str] = []
+
+        def emit() -> Dict[str, Any]:
+            content = "\n".join(blocks)
+            return {
+                "content": content,
+                "token_count": self.count_tokens(content),
+                "sections": [section.strip("= ") for section in sections]
+            }
+
+        current_header = None
+        for header, paragraph, tokens, starts_section in self._iter_blocks(text):
+            added = [header, paragraph] if starts_section and header else [paragraph]
+
+            if blocks and not self._fits(blocks + added):
+                yield emit()
+                if starts_section:
+                    # Don't carry overlap across section boundaries
+                    blocks, block_tokens, sections = [], [], []
+                else:
+                    # Keep trailing paragraphs of this section as overlap
+                    overlap: List[Tuple[str, int]] = []
+                    overlap_tokens = 0
+                    for block, count in zip(reversed(blocks), reversed(block_tokens)):
+                        if block == current_header or overlap_tokens + count > self.overlap_tokens:
+                            break
+                        overlap.insert(0, (block, count))
+                        overlap_tokens += count
+                    # Repeat the section header so continued chunks keep their context
+                    prefix = [(current_header, self.count_tokens(current_header))] if current_header else []
+                    while overlap and not self._fits([block for block, _ in prefix + overlap] + added):
+                        overlap.pop(0)
+                    if prefix and not self._fits([current_header] + added):
+                        prefix = []
+                    blocks = [block for block, _ in prefix + overlap]
+                    block_tokens = [count for _, count in prefix + overlap]
+                    sections = [current_header] if current_header else []
+
+            if starts_section:
+                current_header = header
+                if header:
+                    blocks.append(header)
+                    block_tokens.append(self.count_tokens(header))
+                    sections.append(header)
+
+            blocks.append(paragraph)
+            block_tokens.append(tokens)
+
+        if blocks:
+            yield emit()
+
+# Global chunker instance
+chunker = StructuredChunker(settings.chunk_max_tokens, settings.chunk_overlap_tokens)
@@ -7,6 +7,7 @@ class Settings(BaseSettings):
     supabase_url: str = os.getenv("SUPABASE_URL", "")
     supabase_service_role_key: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
     supabase_anon_key: str = os.getenv("SUPABASE_ANON_KEY", "")
+    db_max_workers: int = int(os.getenv("DB_MAX_WORKERS", "16"))  # Concurrent Supabase queries per worker
     
     # JWT Configuration
     jwt_secret_key: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -19,9 +20,59 @@ class Settings(BaseSettings):
     azure_tenant_id: str = os.getenv("AZURE_TENANT_ID", "common")
     azure_redirect_uri: str = os.getenv("AZURE_REDIRECT_URI", "http://localhost:8000/api/auth/microsoft/callback")
     onedrive_api_url: str = os.getenv("ONEDRIVE_API_URI", "https://graph.microsoft.com/v1.0/me/drive")
+    onedrive_max_connections: int = int(os.getenv("ONEDRIVE_MAX_CONNECTIONS", "20"))  # Pooled connections for OneDrive downloads
+    onedrive_downloads_per_user: int = int(os.getenv("ONEDRIVE_DOWNLOADS_PER_USER", "2"))  # Concurrent downloads per user
+    onedrive_timeout_seconds: float = float(os.getenv("ONEDRIVE_TIMEOUT_SECONDS", "60"))  # Per read/write, not the whole download
 
     # OpenAI Configuration
     openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
+    openai_base_url: Optional[str] = os.getenv("OPENAI_BASE_URL")  # e.g. a local fake embedding server
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # Max inputs per embeddings request
+    embedding_batch_max_tokens: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))  # Max tokens per embeddings request
+    embedding_cache_path: str = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")  # Empty disables the cache
+    embedding_cache_max_entries: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))  # ~6KB per cached embedding
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))  # Concurrent OpenAI requests per worker
+    openai_max_streams: int = int(os.getenv("OPENAI_MAX_STREAMS", "20"))  # Concurrent streaming chat completions per worker
+    chunk_max_tokens: int = int(os.getenv("CHUNK_MAX_TOKENS", "512"))  # Upper bound on tokens per chunk
+    chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))  # Overlap between pieces of one section
+    chunk_insert_batch_size: int = int(os.getenv("CHUNK_INSERT_BATCH_SIZE", "200"))  # Rows per document_chunks insert
+    
+    # Vector Search Configuration
+    vector_search_backend: str = os.getenv("VECTOR_SEARCH_BACKEND", "postgres")  # "postgres" or "local"
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # "hybrid" (vector + keyword, fused) or "vector"
+    hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", "20"))  # Hits taken from each search before fusion
+    rrf_k: int = int(os.getenv("RRF_K", "60"))  # Reciprocal rank fusion damping constant
+    vector_search_ef_search: int = int(os.getenv("VECTOR_SEARCH_EF_SEARCH", "40"))  # HNSW recall/latency trade-off
+    vector_search_probes: int = int(os.getenv("VECTOR_SEARCH_PROBES", "10"))  # ivfflat lists probed per query
+    local_index_path: str = os.getenv("LOCAL_INDEX_PATH", "vector_index")  # Directory for the memory-mapped index, one per worker process
+    local_index_sync_seconds: int = int(os.getenv("LOCAL_INDEX_SYNC_SECONDS", "30"))
+    local_index_sync_batch_size: int = int(os.getenv("LOCAL_INDEX_SYNC_BATCH_SIZE", "500"))
+    local_index_sync_overlap_seconds: int = int(os.getenv("LOCAL_INDEX_SYNC_OVERLAP_SECONDS", "120"))  # Re-scanned on every sync for chunks committed late
+    local_index_use_hnsw: bool = os.getenv("LOCAL_INDEX_USE_HNSW", "True").lower() == "true"  # Used when hnswlib is installed
+    local_index_ef_search: int = int(os.getenv("LOCAL_INDEX_EF_SEARCH", "64"))
+    
+    # Cache Configuration
+    query_cache_max_entries: int = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "5000"))  # Query embeddings kept per worker
+    query_cache_ttl_seconds: int = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+    redis_url: Optional[str] = os.getenv("REDIS_URL")  # Optional shared cache backend
+    user_cache_max_entries: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))  # Authenticated users kept per worker
+    user_cache_ttl_seconds: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))  # Bounds staleness of changes made outside update_user
+    document_file_cache_max_entries: int = int(os.getenv("DOCUMENT_FILE_CACHE_MAX_ENTRIES", "10000"))  # Download/serve metadata kept per worker
+    document_file_cache_ttl_seconds: int = int(os.getenv("DOCUMENT_FILE_CACHE_TTL_SECONDS", "300"))
+    file_cache_max_age_seconds: int = int(os.getenv("FILE_CACHE_MAX_AGE_SECONDS", "3600"))  # Browser cache lifetime for files with a content hash
+    
+    # Ingestion Configuration
+    storage_path: str = os.getenv("STORAGE_PATH", "uploads")  # Root of the content-addressed file store
+    upload_chunk_size: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # Bytes read per upload chunk
+    ingestion_workers: int = int(os.getenv("INGESTION_WORKERS", "2"))  # Documents processed in parallel
+    extraction_workers: int = int(os.getenv("EXTRACTION_WORKERS", "0"))  # Extraction processes, 0 = one per CPU
+    extraction_timeout_seconds: int = int(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "120"))  # Per-file extraction limit
+    extraction_memory_limit_mb: int = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "1024"))  # Address-space cap per extraction process, 0 = none
+    ingestion_job_history: int = int(os.getenv("INGESTION_JOB_HISTORY", "1000"))  # Finished jobs kept for status lookups
+    deletion_workers: int = int(os.getenv("DELETION_WORKERS", "2"))  # Documents deleted in parallel in the background
+    chunk_delete_batch_size: int = int(os.getenv("CHUNK_DELETE_BATCH_SIZE", "500"))  # Rows per document_chunks delete
+    insights_workers: int = int(os.getenv("INSIGHTS_WORKERS", "2"))  # Background insight regenerations in parallel
     
     # Application Configuration
     app_name: str = "SharePoint AI Platform"
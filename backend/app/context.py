@@ -0,0 +1,67 @@
+# Request-scoped loader for the user data that AI responses are built from
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from .database import db_manager
+
+logger = logging.getLogger(__name__)
+
+SearchFunction = Callable[[str, int], Awaitable[List[Dict[str, Any]]]]
+MultiSearchFunction = Callable[[List[str], int], Awaitable[List[Dict[str, Any]]]]
+
+class RequestContext:
+    """
+    Memoizes a user's assignments, documents and retrieval results for one request
+
+    Each lookup starts as a task the first time it is asked for, so independent
+    lookups run concurrently and repeated ones share the same result. Create one
+    per request; nothing is shared between requests.
+    """
+
+    def __init__(self, user_id: Optional[str], search: SearchFunction, search_many: MultiSearchFunction):
+        self.user_id = user_id
+        self._search = search
+        self._search_many = search_many
+        self._tasks: Dict[Hashable, "asyncio.Future"] = {}
+
+    def _load(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> "asyncio.Future":
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        return task
+
+    @staticmethod
+    async def _empty() -> List[Dict[str, Any]]:
+        return []
+
+    @staticmethod
+    async def _none() -> None:
+        return None
+
+    def assignments(self) -> "asyncio.Future":
+        """Assignments of the user (started on first call, awaitable any number of times)"""
+        if not self.user_id:
+            return self._load("assignments", self._empty)
+        return self._load("assignments", lambda: db_manager.get_user_assignments(self.user_id))
+
+    def assignment_stats(self) -> "asyncio.Future":
+        """Assignment counts of the user (started on first call, awaitable any number of times)"""
+        if not self.user_id:
+            return self._load("assignment_stats", self._none)
+        return self._load("assignment_stats", lambda: db_manager.get_assignment_stats(self.user_id))
+
+    def documents(self) -> "asyncio.Future":
+        """Documents of the user (started on first call, awaitable any number of times)"""
+        if not self.user_id:
+            return self._load("documents", self._empty)
+        return self._load("documents", lambda: db_manager.get_user_documents(self.user_id))
+
+    def search(self, query: str, limit: int = 5) -> "asyncio.Future":
+        """Chunks relevant to a query (started on first call, awaitable any number of times)"""
+        return self._load(("search", query, limit), lambda: self._search(query, limit))
+
+    def search_many(self, queries: List[str], limit: int = 5) -> "asyncio.Future":
+        """Chunks relevant to any of several queries, merged (started on first call, awaitable any number of times)"""
+        return self._load(("search_many", tuple(queries), limit), lambda: self._search_many(list(queries), limit))
@@ -1,16 +1,59 @@
 from supabase import create_client, Client
 from typing import Optional, Dict, List, Any
-from datetime import datetime
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import json
 import logging
+import re
+import uuid
 
 from .config import settings
+from .cache import document_file_cache, user_cache
 
 logger = logging.getLogger(__name__)
 
+# Document columns for listings; the extracted `content` can be megabytes per row
+DOCUMENT_LIST_COLUMNS = (
+    "id, title, file_type, file_size, uploaded_by, project_id, content_hash, "
+    "processing_status, processed_at, chunk_count, error_message, created_at"
+)
+
+# Fractional seconds of any precision, e.g. ".12" or ".123456789"
+FRACTION_PATTERN = re.compile(r"\.(\d+)")
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse a database timestamp into an aware datetime (naive values are taken as UTC)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip().replace(" ", "T", 1).replace("Z", "+00:00")
+        # Older fromisoformat only accepts 3 or 6 fraction digits
+        text = FRACTION_PATTERN.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), text, count=1)
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
 class DatabaseManager:
     def __init__(self):
         self.client: Optional[Client] = None
+        # The Supabase client is synchronous, so queries run on a bounded
+        # thread pool to keep them off the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.db_max_workers,
+            thread_name_prefix="supabase"
+        )
+    
+    async def _execute(self, query):
+        """Run a blocking Supabase query on the database executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, query.execute)
     
     async def initialize(self):
         """Initialize the database connection"""
@@ -29,6 +72,7 @@ class DatabaseManager:
         if self.client:
             # Supabase client doesn't need explicit closing
             logger.info("Database connection closed")
+        self.executor.shutdown(wait=False)
     
     async def health_check(self) -> Dict[str, Any]:
         """Check database health"""
@@ -37,7 +81,8 @@ class DatabaseManager:
                 return {"status": "disconnected"}
             
             # Simple query to test connection
-            result = self.client.table("users").select("id").limit(1).execute()
+            query = self.client.table("users").select("id").limit(1)
+            result = await self._execute(query)
             return {
                 "status": "connected",
                 "tables_accessible": True
@@ -57,7 +102,8 @@ class DatabaseManager:
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         try:
-            result = self.client.table("users").select("*").eq("id", user_id).execute()
+            query = self.client.table("users").select("*").eq("id", user_id)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
@@ -66,7 +112,8 @@ class DatabaseManager:
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         try:
-            result = self.client.table("users").select("*").eq("email", email).execute()
+            query = self.client.table("users").select("*").eq("email", email)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
@@ -77,7 +124,8 @@ class DatabaseManager:
         try:
             user_data["created_at"] = self.get_timestamp()
             user_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("users").insert(user_data).execute()
+            query = self.client.table("users").insert(user_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating user: {e}")
@@ -87,16 +135,21 @@ class DatabaseManager:
         """Update user information"""
         try:
             user_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("users").update(user_data).eq("id", user_id).execute()
+            query = self.client.table("users").update(user_data).eq("id", user_id)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating user: {e}")
             return None
+        finally:
+            # Authentication must not keep serving the old row
+            user_cache.invalidate(user_id)
     
     async def get_all_users(self) -> List[Dict[str, Any]]:
         """Get all users"""
         try:
-            result = self.client.table("users").select("*").order("name").execute()
+            query = self.client.table("users").select("*").order("name")
+            result = await self._execute(query)
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
@@ -106,7 +159,8 @@ class DatabaseManager:
     async def get_all_projects(self) -> List[Dict[str, Any]]:
         """Get all projects"""
         try:
-            result = self.client.table("projects").select("*").order("name").execute()
+            query = self.client.table("projects").select("*").order("name")
+            result = await self._execute(query)
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting all projects: {e}")
@@ -117,7 +171,8 @@ class DatabaseManager:
         try:
             project_data["created_at"] = self.get_timestamp()
             project_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("projects").insert(project_data).execute()
+            query = self.client.table("projects").insert(project_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating project: {e}")
@@ -127,35 +182,48 @@ class DatabaseManager:
     async def get_user_assignments(self, user_id: str) -> List[Dict[str, Any]]:
         """Get assignments for a specific user"""
         try:
-            result = self.client.table("assignments")\
+            query = self.client.table("assignments")\
                 .select("*, projects(name)")\
                 .eq("assignee_id", user_id)\
-                .order("created_at", desc=True)\
-                .execute()
+                .order("created_at", desc=True)
+            result = await self._execute(query)
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting user assignments: {e}")
             return []
     
-    async def get_user_assignments_by_email(self, user_email: str) -> List[Dict[str, Any]]:
-        """Get assignments for a specific user by email"""
+    async def get_user_assignment(self, assignment_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get one assignment by ID, only if it is assigned to the user"""
         try:
-            result = self.client.table("assignments")\
+            query = self.client.table("assignments")\
                 .select("*, projects(name)")\
-                .eq("assignee_id", user_email)\
-                .order("created_at", desc=True)\
-                .execute()
-            return result.data or []
+                .eq("id", assignment_id)\
+                .eq("assignee_id", user_id)\
+                .limit(1)
+            result = await self._execute(query)
+            return result.data[0] if result.data else None
         except Exception as e:
-            logger.error(f"Error getting user assignments by email: {e}")
-            return []
+            logger.error(f"Error getting assignment {assignment_id}: {e}")
+            return None
+    
+    async def get_assignment_stats(self, user_id: str) -> Optional[Dict[str, int]]:
+        """Get assignment counts by status and priority for a user (see sql/create_assignment_stats_function.sql)"""
+        try:
+            # The function takes a UUID so the assignee index is used; reject anything else here
+            query = self.client.rpc("get_assignment_stats", {"p_user_id": str(uuid.UUID(str(user_id)))})
+            result = await self._execute(query)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error getting assignment stats: {e}")
+            return None
     
     async def create_assignment(self, assignment_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create a new assignment"""
         try:
             assignment_data["created_at"] = self.get_timestamp()
             assignment_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("assignments").insert(assignment_data).execute()
+            query = self.client.table("assignments").insert(assignment_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating assignment: {e}")
@@ -165,7 +233,8 @@ class DatabaseManager:
         """Update assignment"""
         try:
             assignment_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("assignments").update(assignment_data).eq("id", assignment_id).execute()
+            query = self.client.table("assignments").update(assignment_data).eq("id", assignment_id)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating assignment: {e}")
@@ -174,21 +243,91 @@ class DatabaseManager:
     async def delete_assignment(self, assignment_id: str) -> bool:
         """Delete assignment"""
         try:
-            result = self.client.table("assignments").delete().eq("id", assignment_id).execute()
+            query = self.client.table("assignments").delete().eq("id", assignment_id)
+            result = await self._execute(query)
             return len(result.data) > 0
         except Exception as e:
             logger.error(f"Error deleting assignment: {e}")
             return False
     
-    # Document management methods
-    async def get_user_documents(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get documents for a specific user"""
+    # Assignment insights methods
+    async def get_assignment_insights(self, assignment_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get stored insights for an assignment"""
         try:
-            result = self.client.table("documents")\
+            query = self.client.table("assignment_insights")\
                 .select("*")\
+                .eq("assignment_id", assignment_id)\
+                .eq("user_id", user_id)
+            result = await self._execute(query)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error getting assignment insights: {e}")
+            return None
+
+    async def save_assignment_insights(self, insights_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Store insights for an assignment, replacing any older version"""
+        try:
+            query = self.client.table("assignment_insights")\
+                .upsert(insights_data, on_conflict="assignment_id,user_id")
+            result = await self._execute(query)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error saving assignment insights: {e}")
+            return None
+
+    async def get_insights_assignment_ids(self, user_id: str) -> List[str]:
+        """Get IDs of assignments that have stored insights for a user"""
+        try:
+            query = self.client.table("assignment_insights").select("assignment_id").eq("user_id", user_id)
+            result = await self._execute(query)
+            return [row["assignment_id"] for row in result.data or []]
+        except Exception as e:
+            logger.error(f"Error getting insights assignment IDs: {e}")
+            return []
+
+    async def get_document_set_version(self, user_id: str) -> Optional[str]:
+        """Get a version string that changes whenever the user's processed documents change"""
+        try:
+            query = self.client.table("documents")\
+                .select("processed_at", count="exact")\
+                .eq("uploaded_by", user_id)\
+                .eq("processing_status", "completed")\
+                .order("processed_at", desc=True)\
+                .limit(1)
+            result = await self._execute(query)
+            latest = result.data[0]["processed_at"] if result.data else None
+            return f"{result.count or 0}:{latest or ''}"
+        except Exception as e:
+            logger.error(f"Error getting document set version: {e}")
+            return None
+
+    # Document management methods
+    async def get_user_documents(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        before_created_at: Optional[str] = None,
+        before_id: Optional[str] = None,
+        include_content: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get documents for a specific user, newest first, without extracted content unless asked"""
+        try:
+            columns = "*" if include_content else DOCUMENT_LIST_COLUMNS
+            # Documents being deleted in the background are already gone for the user
+            query = self.client.table("documents")\
+                .select(columns)\
                 .eq("uploaded_by", user_id)\
-                .order("created_at", desc=True)\
-                .execute()
+                .neq("processing_status", "deleting")
+            if before_created_at and before_id:
+                # Keyset pagination on (created_at, id), continuing after the last row of the previous page
+                query = query.or_(
+                    f'created_at.lt."{before_created_at}",'
+                    f'and(created_at.eq."{before_created_at}",id.lt.{before_id})'
+                )
+            query = query.order("created_at", desc=True).order("id", desc=True)
+            if limit:
+                query = query.limit(limit)
+            result = await self._execute(query)
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting user documents: {e}")
@@ -199,7 +338,8 @@ class DatabaseManager:
         try:
             document_data["created_at"] = self.get_timestamp()
             document_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("documents").insert(document_data).execute()
+            query = self.client.table("documents").insert(document_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating document: {e}")
@@ -208,28 +348,174 @@ class DatabaseManager:
     async def get_document_by_id(self, document_id: str) -> Optional[Dict[str, Any]]:
         """Get document by ID"""
         try:
-            result = self.client.table("documents").select("*").eq("id", document_id).execute()
+            query = self.client.table("documents").select("*").eq("id", document_id)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error getting document by ID: {e}")
             return None
     
+    async def get_documents_by_status(self, processing_status: str) -> List[Dict[str, Any]]:
+        """Get all documents with a given processing status"""
+        try:
+            query = self.client.table("documents").select("*").eq("processing_status", processing_status)
+            result = await self._execute(query)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting documents by status: {e}")
+            return []
+    
+    async def get_processed_document_by_hash(self, content_hash: str, exclude_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get a completed document with the given file hash, whose extraction and chunks can be reused"""
+        try:
+            query = self.client.table("documents")\
+                .select("id, chunk_count")\
+                .eq("content_hash", content_hash)\
+                .eq("processing_status", "completed")\
+                .gt("chunk_count", 0)
+            if exclude_id:
+                query = query.neq("id", exclude_id)
+            result = await self._execute(query.limit(1))
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error getting document by hash: {e}")
+            return None
+    
+    async def count_documents_by_hash(self, content_hash: str) -> Optional[int]:
+        """Count the documents referencing a stored file (None if the count failed)"""
+        try:
+            query = self.client.table("documents")\
+                .select("id", count="exact")\
+                .eq("content_hash", content_hash)\
+                .limit(1)
+            result = await self._execute(query)
+            return result.count or 0
+        except Exception as e:
+            logger.error(f"Error counting documents by hash: {e}")
+            return None
+    
+    async def clone_document_content(
+        self,
+        source_document_id: str,
+        target_document_id: str,
+        metadata: Dict[str, Any]
+    ) -> Optional[int]:
+        """Copy a document's extracted text and embedded chunks to another document, server-side
+
+        metadata is merged into each copied chunk's metadata. Returns the number of
+        chunks copied (see sql/add_content_addressed_storage.sql).
+        """
+        try:
+            query = self.client.rpc(
+                "clone_document_content",
+                {
+                    "source_document_id": source_document_id,
+                    "target_document_id": target_document_id,
+                    "metadata_patch": metadata
+                }
+            )
+            result = await self._execute(query)
+            return result.data
+        except Exception as e:
+            logger.error(f"Error cloning document content: {e}")
+            return None
+    
+    async def get_documents_by_ids(self, document_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several documents by ID in one request, without their extracted content"""
+        try:
+            query = self.client.table("documents")\
+                .select(f"{DOCUMENT_LIST_COLUMNS}, file_path")\
+                .in_("id", document_ids)
+            result = await self._execute(query)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting documents by ID: {e}")
+            return []
+    
+    async def delete_document_chunks_batch(self, document_id: str, batch_size: int) -> Optional[int]:
+        """Delete up to batch_size chunks of a document (None if the delete failed)
+
+        Keeps each statement short, so deleting a large document doesn't hold
+        locks on document_chunks for the whole document (see sql/add_document_deletion.sql).
+        """
+        try:
+            query = self.client.rpc(
+                "delete_document_chunks_batch",
+                {"target_document_id": document_id, "batch_size": batch_size}
+            )
+            result = await self._execute(query)
+            return result.data or 0
+        except Exception as e:
+            logger.error(f"Error deleting chunks of document {document_id}: {e}")
+            return None
+    
+    async def clear_document_chunks(self, document_id: str) -> bool:
+        """Delete all chunks of a document in batches"""
+        batch_size = settings.chunk_delete_batch_size
+        while True:
+            deleted = await self.delete_document_chunks_batch(document_id, batch_size)
+            if deleted is None:
+                return False
+            if deleted < batch_size:
+                return True
+    
+    async def delete_document(self, document_id: str) -> bool:
+        """Delete a document (chunks left over are removed by the foreign key cascade)"""
+        try:
+            query = self.client.table("documents").delete().eq("id", document_id)
+            result = await self._execute(query)
+            return len(result.data) > 0
+        except Exception as e:
+            logger.error(f"Error deleting document: {e}")
+            return False
+        finally:
+            # Downloads must not keep serving a deleted document
+            document_file_cache.invalidate(document_id)
+    
     async def update_document(self, document_id: str, document_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update document"""
         try:
             document_data["updated_at"] = self.get_timestamp()
-            result = self.client.table("documents").update(document_data).eq("id", document_id).execute()
+            query = self.client.table("documents").update(document_data).eq("id", document_id)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating document: {e}")
             return None
     
+    async def claim_document(self, document_id: str, updated_at: Optional[str]) -> bool:
+        """Touch a document only if it is unchanged since it was read, so one worker claims it"""
+        try:
+            query = self.client.table("documents")\
+                .update({"updated_at": self.get_timestamp()})\
+                .eq("id", document_id)
+            query = query.eq("updated_at", updated_at) if updated_at else query.is_("updated_at", "null")
+            result = await self._execute(query)
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error claiming document {document_id}: {e}")
+            return False
+    
+    async def update_documents(self, document_ids: List[str], document_data: Dict[str, Any]) -> bool:
+        """Apply the same update to several documents in one request"""
+        try:
+            document_data["updated_at"] = self.get_timestamp()
+            query = self.client.table("documents")\
+                .update(document_data, returning="minimal")\
+                .in_("id", document_ids)
+            await self._execute(query)
+            return True
+        except Exception as e:
+            logger.error(f"Error updating documents: {e}")
+            return False
+    
     # Chat history methods
     async def save_chat_message(self, chat_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Save chat message to database"""
         try:
             chat_data["created_at"] = self.get_timestamp()
-            result = self.client.table("chat_messages").insert(chat_data).execute()
+            query = self.client.table("chat_messages").insert(chat_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error saving chat message: {e}")
@@ -243,71 +529,191 @@ class DatabaseManager:
             if session_id:
                 query = query.eq("session_id", session_id)
             
-            result = query.order("created_at", desc=True).limit(limit).execute()
+            result = await self._execute(query.order("created_at", desc=True).limit(limit))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting chat history: {e}")
             return []
 
+    async def get_chat_sessions(
+        self,
+        user_id: str,
+        limit: int = 50,
+        before_last_message_at: Optional[str] = None,
+        before_session_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's chat session summaries, most recently active first"""
+        try:
+            query = self.client.table("chat_sessions")\
+                .select("session_id, message_count, first_message, first_message_at, last_message_at")\
+                .eq("user_id", user_id)
+            if before_last_message_at and before_session_id:
+                # Keyset pagination on (last_message_at, session_id); session IDs are
+                # client-chosen, so escape them inside the quoted filter value
+                before_session_id = before_session_id.replace("\\", "\\\\").replace('"', '\\"')
+                query = query.or_(
+                    f'last_message_at.lt."{before_last_message_at}",'
+                    f'and(last_message_at.eq."{before_last_message_at}",session_id.lt."{before_session_id}")'
+                )
+            query = query.order("last_message_at", desc=True).order("session_id", desc=True).limit(limit)
+            result = await self._execute(query)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting chat sessions: {e}")
+            return []
+
+    async def delete_chat_session(self, user_id: str, session_id: str) -> Optional[int]:
+        """Delete every message in a chat session, returning how many were deleted"""
+        try:
+            query = self.client.table("chat_messages")\
+                .delete(count="exact", returning="minimal")\
+                .eq("user_id", user_id)\
+                .eq("session_id", session_id)
+            result = await self._execute(query)
+            return result.count or 0
+        except Exception as e:
+            logger.error(f"Error deleting chat session: {e}")
+            return None
+
     # Document chunks methods
     async def create_document_chunk(self, chunk_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create a document chunk with embedding"""
         try:
             chunk_data["created_at"] = self.get_timestamp()
-            result = self.client.table("document_chunks").insert(chunk_data).execute()
+            query = self.client.table("document_chunks").insert(chunk_data)
+            result = await self._execute(query)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating document chunk: {e}")
             return None
     
+    async def create_document_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Bulk insert document chunks, one request per batch"""
+        created_chunks = []
+        batch_size = settings.chunk_insert_batch_size
+        
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            try:
+                timestamp = self.get_timestamp()
+                for chunk_data in batch:
+                    chunk_data["created_at"] = timestamp
+                query = self.client.table("document_chunks").insert(batch)
+                result = await self._execute(query)
+                created_chunks.extend(result.data or [])
+            except Exception as e:
+                logger.error(f"Error creating document chunks batch at offset {start}: {e}")
+        
+        return created_chunks
+    
     async def get_document_chunks(self, document_id: str) -> List[Dict[str, Any]]:
         """Get all chunks for a document"""
         try:
-            result = self.client.table("document_chunks")\
+            query = self.client.table("document_chunks")\
                 .select("*")\
                 .eq("document_id", document_id)\
-                .order("chunk_index")\
-                .execute()
+                .order("chunk_index")
+            result = await self._execute(query)
             return result.data if result.data else []
         except Exception as e:
             logger.error(f"Error getting document chunks: {e}")
             return []
     
+    async def get_chunks_since(self, after_created_at: Optional[str], after_id: Optional[str], limit: int = 500) -> List[Dict[str, Any]]:
+        """Get chunks with embeddings created after a (created_at, id) position, oldest first
+
+        Without after_id, chunks created at after_created_at itself are included.
+        """
+        try:
+            query = self.client.table("document_chunks")\
+                .select("id, document_id, content, chunk_index, metadata, embedding, created_at, documents(title, file_type)")
+            if after_created_at and after_id:
+                # Keyset pagination; chunks inserted in one batch share a created_at
+                query = query.or_(
+                    f'created_at.gt."{after_created_at}",'
+                    f'and(created_at.eq."{after_created_at}",id.gt.{after_id})'
+                )
+            elif after_created_at:
+                query = query.gte("created_at", after_created_at)
+            query = query.order("created_at").order("id").limit(limit)
+            result = await self._execute(query)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting chunks since {after_created_at}: {e}")
+            return []
+    
+    async def get_deleted_documents_since(self, after_id: Optional[int], limit: int = 500) -> Optional[List[Dict[str, Any]]]:
+        """Get deleted-document log entries after a log ID, oldest first (None if the read failed)
+
+        See sql/create_deleted_documents_log.sql.
+        """
+        try:
+            query = self.client.table("deleted_documents").select("id, document_id")
+            if after_id is not None:
+                query = query.gt("id", after_id)
+            query = query.order("id").limit(limit)
+            result = await self._execute(query)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting deleted documents since {after_id}: {e}")
+            return None
+    
     async def search_document_chunks(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search document chunks by content (simple text search for now)"""
+        """Search document chunks by keyword, ranked (index-backed, see sql/add_keyword_search.sql)"""
         try:
-            result = self.client.table("document_chunks")\
-                .select("*, documents(title, file_type)")\
-                .ilike("content", f"%{query}%")\
-                .limit(limit)\
-                .execute()
-            return result.data if result.data else []
+            query = self.client.rpc(
+                "search_document_chunks_ranked",
+                {"query_text": query, "match_count": limit}
+            )
+            result = await self._execute(query)
+            return [
+                {
+                    "id": chunk["id"],
+                    "document_id": chunk["document_id"],
+                    "content": chunk["content"],
+                    "metadata": chunk.get("metadata") or {},
+                    "rank": chunk["rank"],
+                    "document_title": chunk["document_title"],
+                    "document_file_type": chunk.get("document_file_type")
+                }
+                for chunk in result.data or []
+            ]
         except Exception as e:
             logger.error(f"Error searching document chunks: {e}")
             return []
 
-    async def vector_search_chunks(self, query_embedding: List[float], limit: int = 5, match_threshold: float = 0.7) -> List[Dict[str, Any]]:
-        """Search document chunks using vector similarity"""
+    async def vector_search_chunks(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        match_threshold: float = 0.7,
+        ef_search: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Search document chunks using vector similarity (index-backed, see sql/optimize_vector_search.sql)"""
         try:
-            # Use the simpler search function to avoid overloading conflicts
-            result = self.client.rpc(
-                "search_document_chunks",
+            query = self.client.rpc(
+                "match_document_chunks_v2",
                 {
                     "query_embedding": query_embedding,
-                    "similarity_threshold": match_threshold,
-                    "result_limit": limit
+                    "match_threshold": match_threshold,
+                    "match_count": limit,
+                    "ef_search": ef_search or settings.vector_search_ef_search,
+                    "probes": settings.vector_search_probes
                 }
-            ).execute()
+            )
+            result = await self._execute(query)
             
             # Transform the result to match expected format
             if result.data:
                 return [
                     {
-                        "id": chunk["chunk_id"],
+                        "id": chunk["id"],
                         "document_id": chunk["document_id"],
                         "content": chunk["content"],
-                        "similarity": chunk["similarity_score"],
-                        "document_title": chunk["document_title"]
+                        "metadata": chunk.get("metadata") or {},
+                        "similarity": chunk["similarity"],
+                        "document_title": chunk["document_title"],
+                        "document_file_type": chunk.get("document_file_type")
                     }
                     for chunk in result.data
                 ]
@@ -317,5 +723,44 @@ class DatabaseManager:
             # Fallback to text search if vector search fails
             return []
 
+    async def vector_search_chunks_multi(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        match_threshold: float = 0.7,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Vector search for several query embeddings in one call (see sql/add_multi_query_search.sql)"""
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return results
+        try:
+            query = self.client.rpc(
+                "match_document_chunks_multi",
+                {
+                    # Sent as vector literals; PostgREST can't map nested JSON arrays onto vector[]
+                    "query_embeddings": [json.dumps(embedding, separators=(",", ":")) for embedding in query_embeddings],
+                    "match_threshold": match_threshold,
+                    "match_count": limit,
+                    "ef_search": ef_search or settings.vector_search_ef_search,
+                    "probes": settings.vector_search_probes
+                }
+            )
+            result = await self._execute(query)
+            for chunk in result.data or []:
+                results[chunk["query_index"]].append({
+                    "id": chunk["id"],
+                    "document_id": chunk["document_id"],
+                    "content": chunk["content"],
+                    "metadata": chunk.get("metadata") or {},
+                    "similarity": chunk["similarity"],
+                    "document_title": chunk["document_title"],
+                    "document_file_type": chunk.get("document_file_type")
+                })
+            return results
+        except Exception as e:
+            logger.error(f"Error in multi-query vector search: {e}")
+            return results
+
 # Global database manager instance
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,105 @@
+# Background deletion of documents, their chunks and stored files
+import asyncio
+import logging
+from typing import Dict, Any, List, Set
+
+from .cache import document_file_cache
+from .config import settings
+from .database import db_manager
+from .insights import insights_store
+from .storage import content_store
+from .vector_index import vector_index
+
+logger = logging.getLogger(__name__)
+
+class DocumentDeleter:
+    """
+    Deletes documents outside the request
+
+    A document is marked "deleting" and dropped from the download cache right
+    away. Its chunks are then evicted from the local vector index and deleted in
+    batches, the row is deleted and the stored file is released. Documents still
+    marked "deleting" at startup (e.g. after a crash) are picked up again.
+    """
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(settings.deletion_workers)
+        # Document IDs with a deletion scheduled or running
+        self._pending: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+
+    def _track(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def schedule(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """Mark documents as deleting and delete them in the background
+
+        Returns the IDs of the documents scheduled (ones already being deleted are skipped).
+        """
+        documents = [document for document in documents if document["id"] not in self._pending]
+        document_ids = [document["id"] for document in documents]
+        if not document_ids:
+            return []
+
+        if not await db_manager.update_documents(document_ids, {"processing_status": "deleting"}):
+            logger.warning(f"Could not mark {len(document_ids)} documents as deleting, deleting anyway")
+
+        for document in documents:
+            self._pending.add(document["id"])
+            # Stop serving the file before any of the slower work starts
+            document_file_cache.invalidate(document["id"])
+            self._track(self._delete(document))
+        logger.info(f"Scheduled deletion of {len(document_ids)} documents")
+        return document_ids
+
+    async def _delete(self, document: Dict[str, Any]):
+        """Delete one document, its chunks and its file"""
+        document_id = document["id"]
+        try:
+            async with self.semaphore:
+                if settings.vector_search_backend == "local":
+                    await asyncio.to_thread(vector_index.remove_document, document_id)
+
+                batch_size = settings.chunk_delete_batch_size
+                chunks_deleted = 0
+                while True:
+                    deleted = await db_manager.delete_document_chunks_batch(document_id, batch_size)
+                    if deleted is None:
+                        raise RuntimeError("failed to delete chunks")
+                    chunks_deleted += deleted
+                    if deleted < batch_size:
+                        break
+
+                if not await db_manager.delete_document(document_id):
+                    raise RuntimeError("failed to delete document row")
+
+                await content_store.release_document(document)
+                if document.get("uploaded_by"):
+                    # Stored assignment insights may cite this document
+                    insights_store.schedule_for_user(document["uploaded_by"])
+                logger.info(f"Deleted document {document_id} with {chunks_deleted} chunks")
+        except Exception as e:
+            # The row stays marked "deleting", so the next startup retries it
+            logger.error(f"Error deleting document {document_id}: {e}")
+        finally:
+            self._pending.discard(document_id)
+
+    async def resume(self):
+        """Restart deletions interrupted by a shutdown"""
+        documents = await db_manager.get_documents_by_status("deleting")
+        if documents:
+            logger.info(f"Resuming deletion of {len(documents)} documents")
+            await self.schedule(documents)
+
+    async def stop(self):
+        """Cancel background deletions (they resume on the next startup)"""
+        tasks = list(self._background)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Global document deleter instance
+document_deleter = DocumentDeleter()
@@ -0,0 +1,63 @@
+# Shared FastAPI dependencies
+import logging
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException, Request
+
+from .auth import auth_manager
+from .cache import user_cache
+from .database import db_manager
+
+logger = logging.getLogger(__name__)
+
+async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get a user by ID, through the user cache"""
+    user = user_cache.get_by_id(user_id)
+    if user is None:
+        user = await db_manager.get_user_by_id(user_id)
+        if user:
+            user_cache.set(user)
+    return dict(user) if user else None
+
+async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    """Get a user by email, through the user cache"""
+    user = user_cache.get_by_email(email)
+    if user is None:
+        user = await db_manager.get_user_by_email(email)
+        if user:
+            user_cache.set(user)
+    return dict(user) if user else None
+
+async def get_current_user(request: Request) -> Dict[str, Any]:
+    """
+    Get the current user from a bearer JWT issued at login
+
+    Falls back to the x-user-email header (development mode) when no token is sent.
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        payload = auth_manager.decode_access_token(token)
+        if not payload or not payload.get("sub"):
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        user = await get_user_by_id(payload["sub"])
+    else:
+        user_email = request.headers.get("x-user-email")
+        if not user_email:
+            raise HTTPException(
+                status_code=401,
+                detail="No user email provided in headers"
+            )
+        user = await get_user_by_email(user_email)
+
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found in database"
+        )
+
+    return user
@@ -3,13 +3,49 @@ import os
 import io
 import logging
 import mimetypes
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 import tempfile
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Extractors take raw bytes or a path to the stored file
+FileSource = Union[bytes, str, os.PathLike]
+
+def _open_source(file_content: FileSource):
+    """Get something the parsing libraries can read: a path as-is, or bytes wrapped in a stream"""
+    if isinstance(file_content, bytes):
+        return io.BytesIO(file_content)
+    return os.fspath(file_content)
+
+def _read_source(file_content: FileSource) -> bytes:
+    """Get the raw bytes of a source"""
+    if isinstance(file_content, bytes):
+        return file_content
+    return Path(file_content).read_bytes()
+
+def _limit_worker_memory(memory_limit_mb: int):
+    """Cap the address space of an extraction worker process"""
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        # Not available on every platform (e.g. Windows)
+        logger.warning(f"Could not set extraction worker memory limit: {e}")
+
+def _run_extractor(extractor, file_content: FileSource) -> str:
+    """Run an extractor inside a worker process"""
+    return extractor(file_content)
+
 class DocumentProcessor:
     """Service for extracting text content from various document formats"""
     
@@ -28,17 +64,69 @@ class DocumentProcessor:
             'application/vnd.ms-excel': self._extract_xls,
             'application/vnd.ms-powerpoint': self._extract_ppt,
         }
+        # CPU-bound parsing runs in worker processes so it can't stall the event loop
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._max_workers = settings.extraction_workers or os.cpu_count() or 1
+        # Files wait here rather than in the pool queue, so the timeout only covers extraction time
+        self._slots = asyncio.Semaphore(self._max_workers)
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Get the extraction process pool, creating it on first use"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_worker_memory,
+                initargs=(settings.extraction_memory_limit_mb,)
+            )
+        return self._pool
+    
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        """Kill the extraction workers, e.g. after one got stuck on a pathological file"""
+        if self._pool is pool:
+            self._pool = None
+        # A running task can't be cancelled, so its worker process has to be terminated
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        """Shut down the extraction process pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    async def _run_in_pool(self, extractor, file_content: FileSource, filename: str) -> str:
+        """Run an extractor in the process pool with a per-file timeout"""
+        async with self._slots:
+            for attempt in range(2):
+                pool = self._get_pool()
+                future = pool.submit(_run_extractor, extractor, file_content)
+                try:
+                    return await asyncio.wait_for(
+                        asyncio.wrap_future(future),
+                        timeout=settings.extraction_timeout_seconds
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"Text extraction for {filename} exceeded {settings.extraction_timeout_seconds}s, killing worker")
+                    self._reset_pool(pool)
+                    raise TimeoutError(f"Text extraction timed out after {settings.extraction_timeout_seconds} seconds")
+                except BrokenProcessPool:
+                    # Another file's timeout or a worker hitting its memory cap took the pool down
+                    logger.warning(f"Extraction pool broke while processing {filename} (attempt {attempt + 1})")
+                    self._reset_pool(pool)
+        raise RuntimeError("Text extraction worker crashed")
     
     def is_supported(self, content_type: str) -> bool:
         """Check if the content type is supported for text extraction"""
         return content_type in self.supported_types
     
-    async def extract_text(self, file_content: bytes, content_type: str, filename: str = "") -> Tuple[str, Dict[str, Any]]:
+    async def extract_text(self, file_content: FileSource, content_type: str, filename: str = "") -> Tuple[str, Dict[str, Any]]:
         """
-        Extract text content from file bytes
+        Extract text content from file bytes or a stored file
         
         Args:
-            file_content: Raw file bytes
+            file_content: Raw file bytes, or a path so workers read the file themselves
             content_type: MIME type of the file
             filename: Original filename (optional, used for type detection)
         
@@ -61,7 +149,7 @@ class DocumentProcessor:
             
             # Extract text using appropriate method
             extractor = self.supported_types[content_type]
-            text_content = await extractor(file_content)
+            text_content = await self._run_in_pool(extractor, file_content, filename)
             
             # Generate metadata
             metadata = {
@@ -79,7 +167,7 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from {filename}: {str(e)}")
             return "", {"error": str(e), "extraction_success": False}
     
-    def _detect_content_type(self, file_content: bytes, filename: str) -> Optional[str]:
+    def _detect_content_type(self, file_content: FileSource, filename: str) -> Optional[str]:
         """Auto-detect content type from file extension or content"""
         if filename:
             # Try to detect from extension
@@ -87,6 +175,11 @@ class DocumentProcessor:
             if content_type:
                 return content_type
         
+        # Only the start of the file is needed for sniffing
+        if not isinstance(file_content, bytes):
+            with open(file_content, "rb") as f:
+                file_content = f.read(1000)
+        
         # Try to detect from content (basic detection)
         if file_content.startswith(b'%PDF'):
             return 'application/pdf'
@@ -100,10 +193,12 @@ class DocumentProcessor:
         
         return None
     
-    async def _extract_text(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_text(file_content: FileSource) -> str:
         """Extract text from plain text files"""
         try:
             # Try UTF-8 first, fallback to latin-1
+            file_content = _read_source(file_content)
             try:
                 return file_content.decode('utf-8')
             except UnicodeDecodeError:
@@ -112,13 +207,14 @@ class DocumentProcessor:
             logger.error(f"Error extracting plain text: {str(e)}")
             return ""
     
-    async def _extract_html(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_html(file_content: FileSource) -> str:
         """Extract text from HTML files"""
         try:
             # Try to import BeautifulSoup for better HTML parsing
             try:
                 from bs4 import BeautifulSoup
-                html_content = file_content.decode('utf-8', errors='ignore')
+                html_content = _read_source(file_content).decode('utf-8', errors='ignore')
                 soup = BeautifulSoup(html_content, 'html.parser')
                 # Remove script and style elements
                 for script in soup(["script", "style"]):
@@ -127,14 +223,15 @@ class DocumentProcessor:
             except ImportError:
                 # Fallback to simple HTML tag removal
                 import re
-                html_content = file_content.decode('utf-8', errors='ignore')
+                html_content = _read_source(file_content).decode('utf-8', errors='ignore')
                 clean_text = re.sub('<[^<]+?>', '', html_content)
                 return clean_text.strip()
         except Exception as e:
             logger.error(f"Error extracting HTML text: {str(e)}")
             return ""
     
-    async def _extract_pdf(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_pdf(file_content: FileSource) -> str:
         """Extract text from PDF files"""
         try:
             # Try multiple PDF extraction methods
@@ -143,11 +240,10 @@ class DocumentProcessor:
             # Method 1: PyPDF2
             try:
                 import PyPDF2
-                pdf_file = io.BytesIO(file_content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
+                pdf_reader = PyPDF2.PdfReader(_open_source(file_content))
                 
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
+                for page_num, page in enumerate(pdf_reader.pages, 1):
+                    text_content += f"=== Page {page_num} ===\n" + page.extract_text() + "\n"
                 
                 if text_content.strip():
                     return text_content
@@ -159,11 +255,11 @@ class DocumentProcessor:
             # Method 2: pdfplumber (if available)
             try:
                 import pdfplumber
-                with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                    for page in pdf.pages:
+                with pdfplumber.open(_open_source(file_content)) as pdf:
+                    for page_num, page in enumerate(pdf.pages, 1):
                         page_text = page.extract_text()
                         if page_text:
-                            text_content += page_text + "\n"
+                            text_content += f"=== Page {page_num} ===\n" + page_text + "\n"
                 
                 if text_content.strip():
                     return text_content
@@ -182,12 +278,13 @@ class DocumentProcessor:
             logger.error(f"Error extracting PDF text: {str(e)}")
             return "[PDF content - extraction failed]"
     
-    async def _extract_docx(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_docx(file_content: FileSource) -> str:
         """Extract text from Word documents (.docx)"""
         try:
             from docx import Document
             
-            doc = Document(io.BytesIO(file_content))
+            doc = Document(_open_source(file_content))
             text_content = []
             
             # Extract paragraphs
@@ -214,12 +311,14 @@ class DocumentProcessor:
             logger.error(f"Error extracting DOCX text: {str(e)}")
             return "[Word document - extraction failed]"
     
-    async def _extract_xlsx(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_xlsx(file_content: FileSource) -> str:
         """Extract text from Excel spreadsheets (.xlsx)"""
         try:
             import openpyxl
             
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content), data_only=True)
+            # Read-only mode streams rows instead of loading the whole workbook
+            workbook = openpyxl.load_workbook(_open_source(file_content), read_only=True, data_only=True)
             text_content = []
             
             for sheet_name in workbook.sheetnames:
@@ -234,6 +333,7 @@ class DocumentProcessor:
                     if row_text:
                         text_content.append(" | ".join(row_text))
             
+            workbook.close()
             return "\n".join(text_content)
             
         except ImportError:
@@ -243,12 +343,13 @@ class DocumentProcessor:
             logger.error(f"Error extracting XLSX text: {str(e)}")
             return "[Excel spreadsheet - extraction failed]"
     
-    async def _extract_pptx(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_pptx(file_content: FileSource) -> str:
         """Extract text from PowerPoint presentations (.pptx)"""
         try:
             from pptx import Presentation
             
-            presentation = Presentation(io.BytesIO(file_content))
+            presentation = Presentation(_open_source(file_content))
             text_content = []
             
             for slide_num, slide in enumerate(presentation.slides, 1):
@@ -267,7 +368,8 @@ class DocumentProcessor:
             logger.error(f"Error extracting PPTX text: {str(e)}")
             return "[PowerPoint presentation - extraction failed]"
     
-    async def _extract_doc(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_doc(file_content: FileSource) -> str:
         """Extract text from legacy Word documents (.doc)"""
         try:
             # This requires antiword or similar tool, which is complex to install
@@ -277,12 +379,16 @@ class DocumentProcessor:
             logger.error(f"Error extracting DOC text: {str(e)}")
             return "[Legacy Word document - extraction failed]"
     
-    async def _extract_xls(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_xls(file_content: FileSource) -> str:
         """Extract text from legacy Excel files (.xls)"""
         try:
             import xlrd
             
-            workbook = xlrd.open_workbook(file_contents=file_content)
+            if isinstance(file_content, bytes):
+                workbook = xlrd.open_workbook(file_contents=file_content, on_demand=True)
+            else:
+                workbook = xlrd.open_workbook(filename=os.fspath(file_content), on_demand=True)
             text_content = []
             
             for sheet_name in workbook.sheet_names():
@@ -307,7 +413,8 @@ class DocumentProcessor:
             logger.error(f"Error extracting XLS text: {str(e)}")
             return "[Legacy Excel file - extraction failed]"
     
-    async def _extract_ppt(self, file_content: bytes) -> str:
+    @staticmethod
+    def _extract_ppt(file_content: FileSource) -> str:
         """Extract text from legacy PowerPoint files (.ppt)"""
         try:
             # Legacy PPT extraction is complex, recommend conversion
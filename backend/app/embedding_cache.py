@@ -0,0 +1,135 @@
+# Persistent cache of chunk embeddings, keyed by model and content hash
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Any
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache so unchanged chunks are never embedded twice"""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.max_entries > 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize chunk text so whitespace-only differences share a cache entry"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        """Build the cache key from the model name and a hash of the normalized text"""
+        digest = hashlib.sha256(cls.normalize(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache database, creating the table on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                # Touch hits so they survive LRU eviction
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def _put_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", embedding).tobytes(), now) for key, embedding in items.items()]
+            )
+            # Evict least recently used entries beyond the size limit
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            conn.commit()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up cached embeddings for the given keys"""
+        if not self.enabled or not keys:
+            return {}
+        try:
+            return await asyncio.to_thread(self._get_many, keys)
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {e}")
+            return {}
+
+    async def put_many(self, items: Dict[str, List[float]]):
+        """Store embeddings in the cache"""
+        if not self.enabled or not items:
+            return
+        try:
+            await asyncio.to_thread(self._put_many, items)
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "max_entries": self.max_entries
+        }
+
+    def close(self):
+        """Close the cache database"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# Global embedding cache instance
+embedding_cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_entries)
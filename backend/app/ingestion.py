@@ -0,0 +1,242 @@
+# Background ingestion queue for uploaded documents
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from .config import settings
+from .database import db_manager
+from .ai_service import ai_service
+from .document_processor import document_processor
+from .vector_index import vector_index
+from .insights import insights_store
+
+logger = logging.getLogger(__name__)
+
+class IngestionQueue:
+    """Worker queue that extracts, chunks and embeds documents outside the request"""
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        # Recent jobs by ID, oldest first
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def start(self):
+        """Start the ingestion workers"""
+        self.queue = asyncio.Queue()
+        self.workers = [
+            asyncio.create_task(self._worker(worker_num))
+            for worker_num in range(settings.ingestion_workers)
+        ]
+        logger.info(f"Ingestion queue started with {len(self.workers)} workers")
+
+    async def stop(self):
+        """Stop the ingestion workers"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("Ingestion queue stopped")
+
+    async def enqueue(
+        self,
+        document_id: str,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        user_id: str,
+        content_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Queue a stored document for text extraction and embedding"""
+        timestamp = db_manager.get_timestamp()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "document_id": document_id,
+            "user_id": user_id,
+            "filename": filename,
+            "content_type": content_type,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "status": "queued",
+            "progress": 0.0,
+            "chunks_created": 0,
+            "error": None,
+            "created_at": timestamp,
+            "updated_at": timestamp
+        }
+        self.jobs[job["job_id"]] = job
+
+        # Forget the oldest jobs once the history is full
+        while len(self.jobs) > settings.ingestion_job_history:
+            self.jobs.popitem(last=False)
+
+        await self.queue.put(job)
+        logger.info(f"Queued ingestion job {job['job_id']} for document {document_id} ({self.queue.qsize()} waiting)")
+        return job
+
+    async def resume(self):
+        """Re-queue uploaded documents left pending or processing by a shutdown"""
+        documents = []
+        for processing_status in ("pending", "processing"):
+            documents.extend(await db_manager.get_documents_by_status(processing_status))
+
+        resumed = 0
+        for document in documents:
+            if not document.get("file_path"):
+                # OneDrive entries without a fetched file wait for process-onedrive
+                continue
+            if not await db_manager.claim_document(document["id"], document.get("updated_at")):
+                # Changed since it was read, e.g. another worker resumed it first
+                continue
+            if document.get("processing_status") == "processing":
+                # Chunks inserted by the interrupted run would otherwise be duplicated
+                await db_manager.clear_document_chunks(document["id"])
+            await self.enqueue(
+                document["id"],
+                document["file_path"],
+                document.get("title") or "document",
+                document.get("file_type"),
+                document["uploaded_by"],
+                document.get("content_hash")
+            )
+            resumed += 1
+
+        if resumed:
+            logger.info(f"Resumed ingestion of {resumed} documents")
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get an ingestion job by ID"""
+        return self.jobs.get(job_id)
+
+    def _update_job(self, job: Dict[str, Any], **fields):
+        """Update job fields and touch its timestamp"""
+        job.update(fields)
+        job["updated_at"] = db_manager.get_timestamp()
+
+    async def _worker(self, worker_num: int):
+        """Take jobs off the queue until cancelled"""
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_num} failed on job {job['job_id']}: {e}")
+                self._update_job(job, status="failed", error=str(e))
+                await db_manager.update_document(job["document_id"], {
+                    "processing_status": "failed",
+                    "error_message": str(e)
+                })
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: Dict[str, Any]):
+        """Extract, chunk and embed one document, updating its status as it goes"""
+        document_id = job["document_id"]
+
+        # Identical bytes were already processed: copy their text and embeddings instead
+        if job.get("content_hash") and await self._reuse(job):
+            return
+
+        # Stage 1: text extraction
+        self._update_job(job, status="extracting")
+        await db_manager.update_document(document_id, {"processing_status": "processing"})
+
+        # Extraction workers read the stored file themselves
+        extracted_text, extraction_metadata = await document_processor.extract_text(
+            job["file_path"],
+            job["content_type"],
+            job["filename"]
+        )
+
+        if not extracted_text or not extracted_text.strip():
+            error = extraction_metadata.get("error", "No text could be extracted")
+            self._update_job(job, status="failed", error=error)
+            await db_manager.update_document(document_id, {
+                "processing_status": "failed",
+                "error_message": error
+            })
+            return
+
+        await db_manager.update_document(document_id, {"content": extracted_text})
+
+        # Stage 2: chunking and embedding
+        self._update_job(job, status="embedding")
+        logger.info(f"Processing extracted text ({len(extracted_text)} characters) with AI")
+
+        def on_progress(done: int, total: int):
+            self._update_job(job, progress=round(done / total, 2) if total else 1.0)
+
+        processing_result = await ai_service.process_document_content(
+            extracted_text,
+            document_id,
+            {
+                "filename": job["filename"],
+                "file_type": job["content_type"],
+                "uploaded_by": job["user_id"],
+                "extraction_metadata": extraction_metadata
+            },
+            progress_callback=on_progress
+        )
+
+        # Stage 3: record the outcome
+        if processing_result.get("success"):
+            await self._complete(job, processing_result.get("processed_chunks", 0))
+        else:
+            error = processing_result.get("error", "Processing failed")
+            await db_manager.update_document(document_id, {
+                "processing_status": "failed",
+                "error_message": error
+            })
+            self._update_job(job, status="failed", error=error)
+            logger.error(f"Document {document_id} processing failed: {error}")
+
+    async def _reuse(self, job: Dict[str, Any]) -> bool:
+        """Copy extraction and chunks from a processed document with the same file hash
+
+        Returns False if there is nothing to reuse, so the document is processed normally.
+        """
+        document_id = job["document_id"]
+        source = await db_manager.get_processed_document_by_hash(job["content_hash"], exclude_id=document_id)
+        if not source:
+            return False
+
+        self._update_job(job, status="embedding")
+        await db_manager.update_document(document_id, {"processing_status": "processing"})
+        chunks_created = await db_manager.clone_document_content(
+            source["id"],
+            document_id,
+            {
+                "filename": job["filename"],
+                "file_type": job["content_type"],
+                "uploaded_by": job["user_id"],
+                "reused_from": source["id"]
+            }
+        )
+        if not chunks_created:
+            logger.warning(f"Could not reuse chunks of document {source['id']} for {document_id}, processing it instead")
+            return False
+
+        logger.info(f"Document {document_id} reuses {chunks_created} chunks of identical document {source['id']}")
+        await self._complete(job, chunks_created)
+        return True
+
+    async def _complete(self, job: Dict[str, Any], chunks_created: int):
+        """Mark a document as processed and make its chunks searchable"""
+        document_id = job["document_id"]
+        await db_manager.update_document(document_id, {
+            "processing_status": "completed",
+            "processed_at": db_manager.get_timestamp(),
+            "chunk_count": chunks_created
+        })
+        self._update_job(job, status="completed", progress=1.0, chunks_created=chunks_created)
+        if settings.vector_search_backend == "local":
+            # Make the new chunks searchable without waiting for the next periodic sync
+            await vector_index.sync()
+        # Stored assignment insights were built without this document
+        insights_store.schedule_for_user(job["user_id"])
+        logger.info(f"Document {document_id} processed successfully with {chunks_created} chunks")
+
+# Global ingestion queue instance
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,157 @@
+# Persisted assignment insights, regenerated in the background when their inputs change
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .config import settings
+from .database import db_manager, parse_timestamp
+from .ai_service import ai_service
+from .context import RequestContext
+
+logger = logging.getLogger(__name__)
+
+InsightsKey = Tuple[str, str]
+
+class InsightsStore:
+    """
+    Serves stored assignment insights while they are current
+
+    A stored row is current while the assignment's updated_at and the user's
+    document-set version match the ones it was generated from. Regeneration is
+    scheduled when an assignment is created or updated and when a user's documents
+    finish processing, so opening an assignment is usually a single read.
+    """
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(settings.insights_workers)
+        # Generations in flight, shared by everyone waiting on the same assignment
+        self._running: Dict[InsightsKey, asyncio.Task] = {}
+        # Latest assignment data for background regenerations that haven't started yet
+        self._queued: Dict[InsightsKey, Dict[str, Any]] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _is_current(record: Optional[Dict[str, Any]], assignment: Dict[str, Any], documents_version: Optional[str]) -> bool:
+        return (
+            record is not None
+            and documents_version is not None
+            and record.get("documents_version") == documents_version
+            # Compared as instants: the two columns may serialize with different types or precision
+            and parse_timestamp(record.get("assignment_updated_at")) == parse_timestamp(assignment.get("updated_at"))
+        )
+
+    async def get(
+        self,
+        assignment: Dict[str, Any],
+        user_id: str,
+        context: Optional[RequestContext] = None,
+        refresh: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Get current insights for an assignment, generating them if missing or stale"""
+        record, documents_version = await asyncio.gather(
+            db_manager.get_assignment_insights(assignment["id"], user_id),
+            db_manager.get_document_set_version(user_id)
+        )
+        if not refresh and self._is_current(record, assignment, documents_version):
+            return {**record, "cached": True}
+        return await self._generate_once(assignment, user_id, context)
+
+    async def _generate_once(
+        self,
+        assignment: Dict[str, Any],
+        user_id: str,
+        context: Optional[RequestContext] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Generate insights, joining a generation already in flight for the same assignment"""
+        key = (assignment["id"], user_id)
+        task = self._running.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self._generate(assignment, user_id, context))
+            self._running[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # A disconnecting client shouldn't throw away a generation others can use
+        return await asyncio.shield(task)
+
+    def _forget(self, key: InsightsKey, task: asyncio.Task):
+        if self._running.get(key) is task:
+            del self._running[key]
+
+    async def _generate(
+        self,
+        assignment: Dict[str, Any],
+        user_id: str,
+        context: Optional[RequestContext] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Generate and store insights for an assignment"""
+        # Read the version first, so documents arriving mid-generation make the result stale
+        documents_version = await db_manager.get_document_set_version(user_id)
+        result = await ai_service.generate_assignment_insights(assignment, {"user_id": user_id}, context)
+        if not result.get("success"):
+            logger.error(f"Failed to generate insights for assignment {assignment['id']}: {result.get('error', 'Unknown error')}")
+            return None
+
+        record = {
+            "assignment_id": assignment["id"],
+            "user_id": user_id,
+            "assignment_updated_at": assignment.get("updated_at"),
+            "documents_version": documents_version or "",
+            "insights": result["insights"],
+            "generated_at": result["generated_at"]
+        }
+        saved = await db_manager.save_assignment_insights(record)
+        if not saved:
+            logger.warning(f"Failed to store insights for assignment {assignment['id']}")
+        return {**(saved or record), "cached": False}
+
+    def _track(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def schedule(self, assignment: Dict[str, Any], user_id: str):
+        """Regenerate insights for an assignment in the background"""
+        key = (assignment["id"], user_id)
+        already_queued = key in self._queued
+        self._queued[key] = assignment
+        if not already_queued:
+            self._track(self._regenerate_queued(key))
+
+    async def _regenerate_queued(self, key: InsightsKey):
+        try:
+            async with self.semaphore:
+                # Take the newest assignment data; later schedules for this key start a new run
+                assignment = self._queued.pop(key)
+                running = self._running.get(key)
+                if running is not None:
+                    await asyncio.shield(running)
+                # Skips the LLM call if a foreground request already produced current insights
+                await self.get(assignment, key[1])
+        except Exception as e:
+            logger.error(f"Background insights regeneration failed for assignment {key[0]}: {e}")
+
+    def schedule_for_user(self, user_id: str):
+        """Regenerate stored insights for a user's open assignments after their documents change"""
+        self._track(self._refresh_user(user_id))
+
+    async def _refresh_user(self, user_id: str):
+        try:
+            assignment_ids = set(await db_manager.get_insights_assignment_ids(user_id))
+            if not assignment_ids:
+                return
+            for assignment in await db_manager.get_user_assignments(user_id):
+                if assignment["id"] in assignment_ids and assignment.get("status") != "completed":
+                    self.schedule(assignment, user_id)
+        except Exception as e:
+            logger.error(f"Error scheduling insights refresh for user {user_id}: {e}")
+
+    async def stop(self):
+        """Cancel background regenerations"""
+        tasks = list(self._background) + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queued.clear()
+
+# Global insights store instance
+insights_store = InsightsStore()
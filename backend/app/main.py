@@ -1,9 +1,18 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 
 from .database import db_manager
+from .ingestion import ingestion_queue
+from .deletion import document_deleter
+from .onedrive import onedrive_client
+from .insights import insights_store
+from .document_processor import document_processor
+from .embedding_cache import embedding_cache
+from .cache import document_file_cache, query_embedding_cache, user_cache
+from .config import settings
+from .vector_index import vector_index
 from .auth import AuthManager
 from .routes import auth, assignments, chat, documents, projects
 
@@ -14,11 +23,24 @@ auth_manager = AuthManager()
 async def lifespan(app: FastAPI):
     # Startup
     await db_manager.initialize()
+    await ingestion_queue.start()
+    await ingestion_queue.resume()
+    await document_deleter.resume()
+    if settings.vector_search_backend == "local":
+        await vector_index.start()
     print("SharePoint AI Platform Backend Started")
     print("Database connected")
     print("Authentication ready")
+    print("Ingestion workers running")
     yield
     # Shutdown
+    await ingestion_queue.stop()
+    await document_deleter.stop()
+    await insights_store.stop()
+    await vector_index.stop()
+    await onedrive_client.close()
+    document_processor.shutdown()
+    embedding_cache.close()
     await db_manager.close()
 
 app = FastAPI(
@@ -37,26 +59,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Development: Simple user dependency based on email from request headers
-async def get_current_user(request: Request):
-    """Get current user from database based on email (development mode)"""
-    user_email = request.headers.get("x-user-email")
-    if not user_email:
-        raise HTTPException(
-            status_code=401,
-            detail="No user email provided in headers"
-        )
-    
-    # Get user from database
-    user = await db_manager.get_user_by_email(user_email)
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found in database"
-        )
-    
-    return user
-
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -85,6 +87,17 @@ async def health_check():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
 
+@app.get("/metrics")
+async def metrics():
+    """Cache hit-rate metrics for sizing"""
+    return {
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "document_file_cache": document_file_cache.stats(),
+        "timestamp": db_manager.get_timestamp()
+    }
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(assignments.router, prefix="/api/assignments", tags=["Assignments"])
@@ -0,0 +1,92 @@
+# Async OneDrive file downloads
+import asyncio
+import hashlib
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class TooManyDownloads(Exception):
+    """Raised when a user already has the maximum number of downloads in flight"""
+
+class OneDriveClient:
+    """
+    Downloads OneDrive files over a pooled async HTTP client
+
+    Files are streamed to a spool file as they arrive, so neither the event loop
+    nor memory is tied up by large documents. Each user may only have a few
+    downloads in flight at once.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        # Downloads in flight per user ID
+        self._active: Dict[str, int] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.onedrive_timeout_seconds, connect=10.0),
+                limits=httpx.Limits(max_connections=settings.onedrive_max_connections),
+                follow_redirects=True  # Download URLs redirect to the storage host
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _slot(self, user_id: str):
+        """Reserve one of the user's download slots"""
+        active = self._active.get(user_id, 0)
+        if active >= settings.onedrive_downloads_per_user:
+            raise TooManyDownloads(f"At most {settings.onedrive_downloads_per_user} OneDrive downloads at a time")
+        self._active[user_id] = active + 1
+        try:
+            yield
+        finally:
+            self._active[user_id] -= 1
+            if self._active[user_id] == 0:
+                del self._active[user_id]
+
+    async def download(self, url: str, access_token: str, user_id: str, spool_dir: Path) -> Tuple[Path, int, str, Optional[str]]:
+        """Stream a OneDrive file to a spool file in spool_dir, hashing it on the way
+
+        Returns (spool path, size in bytes, SHA-256 hex digest, response content type)
+        """
+        async with self._slot(user_id):
+            spool_path = spool_dir / uuid.uuid4().hex
+            hasher = hashlib.sha256()
+            size = 0
+
+            try:
+                headers = {"Authorization": f"Bearer {access_token}"}
+                async with self._get_client().stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type")
+                    with open(spool_path, "wb") as f:
+                        async for chunk in response.aiter_bytes(settings.upload_chunk_size):
+                            hasher.update(chunk)
+                            size += len(chunk)
+                            await asyncio.to_thread(f.write, chunk)
+            except Exception:
+                spool_path.unlink(missing_ok=True)
+                raise
+
+            if content_type:
+                content_type = content_type.split(";")[0].strip()
+            logger.info(f"Downloaded OneDrive file ({size} bytes, {content_type}) to {spool_path}")
+            return spool_path, size, hasher.hexdigest(), content_type
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Global OneDrive client instance
+onedrive_client = OneDriveClient()
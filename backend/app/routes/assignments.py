@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import logging
 import uuid
-from datetime import datetime
 
 from ..database import db_manager
+from ..dependencies import get_current_user
 from ..ai_service import ai_service
+from ..insights import insights_store
 
 logger = logging.getLogger(__name__)
 
@@ -45,46 +46,21 @@ class AssignmentResponse(BaseModel):
     updated_at: str
     projects: Optional[Dict[str, Any]] = None
 
-# Development: Get current user from email header
-async def get_current_user(request: Request):
-    """Get current user from database based on email (development mode)"""
-    user_email = request.headers.get("x-user-email")
-    if not user_email:
-        raise HTTPException(
-            status_code=401,
-            detail="No user email provided in headers"
-        )
-    
-    # Get user from database
-    user = await db_manager.get_user_by_email(user_email)
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found in database"
-        )
-    
-    return user
+def schedule_insights(assignment: Dict[str, Any]):
+    """Regenerate an assignment's insights in the background for its assignee"""
+    if assignment.get("assignee_id"):
+        insights_store.schedule(assignment, assignment["assignee_id"])
 
 @router.get("/", response_model=List[AssignmentResponse])
 async def get_assignments(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Get all assignments for the current user"""
     try:
-        # Get assignments by user ID and email (to handle both cases)
-        assignments_by_id = await db_manager.get_user_assignments(current_user["id"])
-        assignments_by_email = await db_manager.get_user_assignments_by_email(current_user["email"])
-        
-        # Combine and deduplicate assignments
-        all_assignments = assignments_by_id + assignments_by_email
-        seen_ids = set()
-        unique_assignments = []
-        for assignment in all_assignments:
-            if assignment["id"] not in seen_ids:
-                seen_ids.add(assignment["id"])
-                unique_assignments.append(assignment)
+        # assignee_id is a UUID column, so one lookup by user ID covers every row
+        assignments = await db_manager.get_user_assignments(current_user["id"])
         
         # Transform assignments to match response model
         formatted_assignments = []
-        for assignment in unique_assignments:
+        for assignment in assignments:
             formatted_assignment = AssignmentResponse(
                 id=assignment["id"],
                 title=assignment["title"],
@@ -155,6 +131,9 @@ async def create_assignment(
                 detail="Failed to create assignment!!"
             )
         
+        # Have insights ready by the time the assignee opens it
+        schedule_insights(created_assignment)
+        
         return AssignmentResponse(
             id=created_assignment["id"],
             title=created_assignment["title"],
@@ -185,9 +164,8 @@ async def get_assignment(
 ):
     """Get a specific assignment by ID"""
     try:
-        # Get all user assignments and find the specific one
-        assignments = await db_manager.get_user_assignments(current_user["id"])
-        assignment = next((a for a in assignments if a["id"] == assignment_id), None)
+        # Single indexed lookup; assignments of other users come back as not found
+        assignment = await db_manager.get_user_assignment(assignment_id, current_user["id"])
         
         if not assignment:
             raise HTTPException(
@@ -260,6 +238,8 @@ async def update_assignment(
                 detail="Assignment not found or update failed"
             )
         
+        schedule_insights(updated_assignment)
+        
         return AssignmentResponse(
             id=updated_assignment["id"],
             title=updated_assignment["title"],
@@ -340,6 +320,8 @@ async def update_assignment_status(
                 detail="Assignment not found or update failed"
             )
         
+        schedule_insights(updated_assignment)
+        
         return {
             "message": "Assignment status updated successfully",
             "id": assignment_id,
@@ -360,35 +342,32 @@ async def update_assignment_status(
 async def get_assignment_stats(current_user: Dict[str, Any] = Depends(get_current_user)):
     """Get assignment statistics for the current user"""
     try:
-        assignments = await db_manager.get_user_assignments(current_user["id"])
+        # All counts come from one grouped aggregate in the database
+        stats = await db_manager.get_assignment_stats(current_user["id"])
+        if stats is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to retrieve assignment statistics"
+            )
         
-        total_assignments = len(assignments)
-        completed_assignments = len([a for a in assignments if a.get("status") == "completed"])
-        in_progress_assignments = len([a for a in assignments if a.get("status") == "in-progress"])
-        pending_assignments = len([a for a in assignments if a.get("status") == "todo"])
-        high_priority_assignments = len([a for a in assignments if a.get("priority") == "high"])
+        total_assignments = stats["total_assignments"]
+        completed_assignments = stats["completed_assignments"]
         
         # Calculate completion rate
         completion_rate = (completed_assignments / total_assignments * 100) if total_assignments > 0 else 0
         
-        # Get overdue assignments (assignments past due date)
-        now = datetime.utcnow().isoformat()
-        overdue_assignments = []
-        for assignment in assignments:
-            if assignment.get("due_date") and assignment.get("status") != "completed":
-                if assignment["due_date"] < now:
-                    overdue_assignments.append(assignment)
-        
         return {
             "total_assignments": total_assignments,
             "completed_assignments": completed_assignments,
-            "in_progress_assignments": in_progress_assignments,
-            "pending_assignments": pending_assignments,
-            "high_priority_assignments": high_priority_assignments,
-            "overdue_assignments": len(overdue_assignments),
+            "in_progress_assignments": stats["in_progress_assignments"],
+            "pending_assignments": stats["pending_assignments"],
+            "high_priority_assignments": stats["high_priority_assignments"],
+            "overdue_assignments": stats["overdue_assignments"],
             "completion_rate": round(completion_rate, 2)
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting assignment stats: {e}")
         raise HTTPException(
@@ -399,13 +378,13 @@ async def get_assignment_stats(current_user: Dict[str, Any] = Depends(get_curren
 @router.post("/{assignment_id}/insights")
 async def get_assignment_insights(
     assignment_id: str,
+    refresh: bool = False,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Generate AI insights for a specific assignment"""
+    """Get AI insights for a specific assignment, generating them if stored ones are stale"""
     try:
         # Get the assignment data
-        assignments = await db_manager.get_user_assignments(current_user["id"])
-        assignment = next((a for a in assignments if a["id"] == assignment_id), None)
+        assignment = await db_manager.get_user_assignment(assignment_id, current_user["id"])
         
         if not assignment:
             raise HTTPException(
@@ -413,21 +392,23 @@ async def get_assignment_insights(
                 detail="Assignment not found"
             )
         
-        # Generate AI insights
-        user_context = {"user_id": current_user["id"]}
-        insights_result = await ai_service.generate_assignment_insights(assignment, user_context)
+        # Stored insights if still current, otherwise generate (and store) new ones;
+        # the context only loads documents if generation is needed
+        context = ai_service.request_context(current_user["id"])
+        insights_result = await insights_store.get(assignment, current_user["id"], context, refresh=refresh)
         
-        if not insights_result.get("success"):
+        if not insights_result:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to generate insights: {insights_result.get('error', 'Unknown error')}"
+                detail="Failed to generate insights"
             )
         
         return {
             "assignment_id": assignment_id,
             "assignment_title": assignment.get("title"),
             "insights": insights_result["insights"],
-            "generated_at": insights_result["generated_at"]
+            "generated_at": insights_result["generated_at"],
+            "cached": insights_result["cached"]
         }
     
     except HTTPException:
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Dict, Any
 import logging
 
 from ..auth import auth_manager
 from ..database import db_manager
+from ..dependencies import get_current_user
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +48,10 @@ async def login(user_credentials: UserLogin):
                 detail="Failed to login or create user"
             )
         
-        # Create simple token (just the email for development)
-        access_token = user_credentials.email
+        # Signed token the shared auth dependency can verify without a database lookup
+        access_token = auth_manager.create_access_token(
+            data={"sub": user["id"], "email": user["email"]}
+        )
         
         # Remove sensitive data
         user_data = {k: v for k, v in user.items() if k not in ["password_hash"]}
@@ -107,37 +110,10 @@ async def register(user_data: UserRegister):
 
 
 @router.get("/me")
-async def get_current_user_info(request: Request):
-    """Get current user information (development mode)"""
-    try:
-        user_email = request.headers.get("x-user-email")
-        if not user_email:
-            raise HTTPException(
-                status_code=401,
-                detail="No user email provided in headers"
-            )
-        
-        # Get user from database
-        user = await db_manager.get_user_by_email(user_email)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Remove sensitive data
-        user_data = {k: v for k, v in user.items() if k not in ["password_hash"]}
-        
-        return user_data
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Get user info error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to get user information"
-        )
+async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Get current user information"""
+    # Remove sensitive data
+    return {k: v for k, v in current_user.items() if k not in ["password_hash"]}
 
 @router.get("/users")
 async def get_all_users():
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+import asyncio
+import base64
+import json
 import logging
+import re
 import uuid
 from datetime import datetime
 
 from ..database import db_manager
+from ..dependencies import get_current_user
 from ..ai_service import ai_service
 
 logger = logging.getLogger(__name__)
@@ -123,26 +129,6 @@ Try asking me: *"What assignments do I have?"* or *"Show me recent documents"*""
     }
 }
 
-# Development: Get current user from email header
-async def get_current_user(request: Request):
-    """Get current user from database based on email (development mode)"""
-    user_email = request.headers.get("x-user-email")
-    if not user_email:
-        raise HTTPException(
-            status_code=401,
-            detail="No user email provided in headers"
-        )
-    
-    # Get user from database
-    user = await db_manager.get_user_by_email(user_email)
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found in database"
-        )
-    
-    return user
-
 def get_ai_response(message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
     """Generate AI response based on user message and context"""
     message_lower = message.lower()
@@ -169,19 +155,12 @@ async def send_message(
     try:
         session_id = chat_message.session_id or str(uuid.uuid4())
         
-        # Get user context for better responses
-        user_assignments = await db_manager.get_user_assignments(current_user["id"])
-        user_documents = await db_manager.get_user_documents(current_user["id"])
-        
-        user_context = {
-            "user_id": current_user["id"],
-            "assignments_count": len(user_assignments),
-            "documents_count": len(user_documents),
-            "recent_assignments": user_assignments[:5] if user_assignments else []
-        }
+        # Assignments, documents and retrieval load concurrently, once each
+        context = ai_service.request_context(current_user["id"])
+        user_context = {"user_id": current_user["id"]}
         
         # Generate AI response using real AI service
-        ai_response = await ai_service.generate_chat_response(chat_message.message, user_context)
+        ai_response = await ai_service.generate_chat_response(chat_message.message, user_context, context)
         
         # Save chat to database
         chat_data = {
@@ -216,6 +195,70 @@ async def send_message(
             detail="Failed to process chat message"
         )
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/stream")
+async def stream_message(
+    chat_message: ChatMessage,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Send a message to the AI assistant and stream the response as server-sent events"""
+    session_id = chat_message.session_id or str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
+    context = ai_service.request_context(current_user["id"])
+    user_context = {"user_id": current_user["id"]}
+
+    async def event_stream():
+        events = ai_service.stream_chat_response(chat_message.message, user_context, context)
+        try:
+            yield format_sse("start", {"id": message_id, "session_id": session_id})
+            async for event in events:
+                if await request.is_disconnected():
+                    logger.info(f"Client disconnected, cancelling chat stream {message_id}")
+                    return
+                
+                if event["type"] == "token":
+                    yield format_sse("token", {"content": event["content"]})
+                elif event["type"] == "error":
+                    yield format_sse("error", {"message": event["message"]})
+                else:
+                    # Only completed answers are saved to the history
+                    chat_data = {
+                        "id": message_id,
+                        "user_id": current_user["id"],
+                        "message": chat_message.message,
+                        "response": event["response"],
+                        "sources": event.get("sources"),
+                        "session_id": session_id
+                    }
+                    saved_chat = await db_manager.save_chat_message(chat_data)
+                    if not saved_chat:
+                        logger.warning("Failed to save chat message to database")
+                    
+                    yield format_sse("done", {
+                        "id": message_id,
+                        "session_id": session_id,
+                        "sources": event.get("sources"),
+                        "context_used": event.get("context_used"),
+                        "confidence": event.get("confidence"),
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+        finally:
+            # Closes the upstream completion if we stopped early
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Don't let a proxy buffer the stream
+        }
+    )
+
 @router.get("/history")
 async def get_chat_history(
     session_id: Optional[str] = None,
@@ -257,45 +300,64 @@ async def get_chat_history(
             detail="Failed to retrieve chat history"
         )
 
+TIMESTAMP_PATTERN = re.compile(r"^[0-9T:.+\- ]+$")
+
+def encode_session_cursor(session: Dict[str, Any]) -> str:
+    """Encode a sessions listing position as an opaque cursor"""
+    position = json.dumps([session["last_message_at"], session["session_id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_session_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor into (last_message_at, session_id)"""
+    try:
+        last_message_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not TIMESTAMP_PATTERN.match(str(last_message_at)):
+            raise ValueError("bad timestamp")
+        return str(last_message_at), str(session_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/sessions")
-async def get_chat_sessions(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Get all chat sessions for the current user"""
+async def get_chat_sessions(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get chat sessions for the current user, most recently active first"""
     try:
-        # Get all chat messages and group by session_id
-        all_chats = await db_manager.get_chat_history(current_user["id"], limit=1000)
+        before_last_message_at, before_session_id = decode_session_cursor(cursor) if cursor else (None, None)
+        
+        # One summary row per session, maintained by triggers on chat_messages
+        summaries = await db_manager.get_chat_sessions(
+            current_user["id"],
+            limit,
+            before_last_message_at,
+            before_session_id
+        )
         
-        sessions = {}
-        for chat in all_chats:
-            session_id = chat.get("session_id", "default")
-            if session_id not in sessions:
-                sessions[session_id] = {
-                    "session_id": session_id,
-                    "message_count": 0,
-                    "first_message": None,
-                    "last_message_time": None,
-                    "preview": ""
-                }
-            
-            sessions[session_id]["message_count"] += 1
-            
-            if not sessions[session_id]["first_message"]:
-                sessions[session_id]["first_message"] = chat["message"]
-                sessions[session_id]["preview"] = chat["message"][:100] + "..." if len(chat["message"]) > 100 else chat["message"]
-            
-            # Update last message time
-            chat_time = chat["created_at"]
-            if not sessions[session_id]["last_message_time"] or chat_time > sessions[session_id]["last_message_time"]:
-                sessions[session_id]["last_message_time"] = chat_time
+        sessions_list = []
+        for summary in summaries:
+            first_message = summary.get("first_message") or ""
+            sessions_list.append({
+                "session_id": summary["session_id"],
+                "message_count": summary["message_count"],
+                "first_message": first_message,
+                "last_message_time": summary["last_message_at"],
+                "preview": first_message[:100] + "..." if len(first_message) > 100 else first_message
+            })
         
-        # Convert to list and sort by last message time
-        sessions_list = list(sessions.values())
-        sessions_list.sort(key=lambda x: x["last_message_time"] or "", reverse=True)
+        next_cursor = None
+        if len(summaries) == limit:
+            next_cursor = encode_session_cursor(summaries[-1])
         
         return {
             "sessions": sessions_list,
-            "total_sessions": len(sessions_list)
+            "total_sessions": len(sessions_list),
+            "next_cursor": next_cursor
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting chat sessions: {e}")
         raise HTTPException(
@@ -310,23 +372,20 @@ async def delete_chat_session(
 ):
     """Delete a chat session (all messages in the session)"""
     try:
-        # Get all messages in the session
-        session_messages = await db_manager.get_chat_history(
-            current_user["id"], 
-            session_id, 
-            limit=1000
-        )
+        deleted_count = await db_manager.delete_chat_session(current_user["id"], session_id)
         
-        if not session_messages:
+        if deleted_count is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to delete chat session"
+            )
+        
+        if not deleted_count:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Chat session not found"
             )
         
-        # In a real implementation, you'd delete the messages from the database
-        # For now, we'll just mark them as deleted in metadata
-        deleted_count = len(session_messages)
-        
         return {
             "message": f"Chat session deleted successfully",
             "session_id": session_id,
@@ -347,19 +406,19 @@ async def get_chat_suggestions(current_user: Dict[str, Any] = Depends(get_curren
     """Get suggested prompts based on user's current context"""
     try:
         # Get user context for AI service
+        context = ai_service.request_context(current_user["id"])
         user_context = {"user_id": current_user["id"]}
         
         # Get suggestions from AI service
-        suggestions = await ai_service.get_chat_suggestions(user_context)
+        suggestions = await ai_service.get_chat_suggestions(user_context, context)
         
-        # Get context for response
-        assignments = await db_manager.get_user_assignments(current_user["id"])
-        documents = await db_manager.get_user_documents(current_user["id"])
+        # Get context for response (already loaded for the suggestions)
+        stats, documents = await asyncio.gather(context.assignment_stats(), context.documents())
         
         return {
             "suggestions": suggestions,
             "context": {
-                "assignments_count": len(assignments) if assignments else 0,
+                "assignments_count": stats["total_assignments"] if stats else 0,
                 "documents_count": len(documents) if documents else 0
             }
         }
@@ -1,45 +1,31 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, status, Request, UploadFile, File, Query
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+import base64
+import json
 import logging
+import re
 import uuid
 from datetime import datetime
-import requests
 import io
 import os
 import shutil
-from pathlib import Path
 
+from ..cache import document_file_cache
+from ..config import settings
 from ..database import db_manager
+from ..deletion import document_deleter
+from ..dependencies import get_current_user, get_user_by_email
 from ..ai_service import ai_service
-from ..document_processor import document_processor
+from ..ingestion import ingestion_queue
+from ..onedrive import onedrive_client, TooManyDownloads
+from ..storage import content_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# File storage configuration
-UPLOADS_DIR = Path("uploads")
-UPLOADS_DIR.mkdir(exist_ok=True)
-
-def save_uploaded_file(file_content: bytes, filename: str, document_id: str) -> str:
-    """Save uploaded file to local storage"""
-    try:
-        # Create safe filename with document ID
-        file_extension = Path(filename).suffix
-        safe_filename = f"{document_id}{file_extension}"
-        file_path = UPLOADS_DIR / safe_filename
-        
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        
-        return str(file_path)
-    except Exception as e:
-        logger.error(f"Error saving file: {e}")
-        raise e
-
 # Pydantic models
 class DocumentResponse(BaseModel):
     id: str
@@ -53,35 +39,57 @@ class DocumentResponse(BaseModel):
 class ProcessDocumentRequest(BaseModel):
     document_id: str
 
-# Development: Get current user from email header
-async def get_current_user(request: Request):
-    """Get current user from database based on email (development mode)"""
-    user_email = request.headers.get("x-user-email")
-    if not user_email:
-        raise HTTPException(
-            status_code=401,
-            detail="No user email provided in headers"
-        )
-    
-    # Get user from database
-    user = await db_manager.get_user_by_email(user_email)
-    if not user:
-        raise HTTPException(
-            status_code=404,
-            detail="User not found in database"
-        )
-    
-    return user
+class BulkDeleteRequest(BaseModel):
+    document_ids: List[str]
+
+# Upper bound on documents per bulk delete request
+MAX_BULK_DELETE = 500
+
+TIMESTAMP_PATTERN = re.compile(r"^[0-9T:.+\- ]+$")
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Encode a listing position as an opaque cursor"""
+    position = json.dumps([document["created_at"], document["id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor into (created_at, id)"""
+    try:
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Both values end up in a filter expression, so only accept what we issue
+        if not TIMESTAMP_PATTERN.match(str(created_at)):
+            raise ValueError("bad timestamp")
+        return str(created_at), str(uuid.UUID(str(document_id)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/")
-async def get_documents(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Get all documents for the current user"""
+async def get_documents(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_content: bool = False,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get documents for the current user, optionally one page at a time"""
     try:
-        documents = await db_manager.get_user_documents(current_user["id"])
+        before_created_at, before_id = decode_cursor(cursor) if cursor else (None, None)
+        documents = await db_manager.get_user_documents(
+            current_user["id"],
+            limit=limit,
+            before_created_at=before_created_at,
+            before_id=before_id,
+            include_content=include_content
+        )
+        next_cursor = None
+        if limit and len(documents) == limit:
+            next_cursor = encode_cursor(documents[-1])
         return {
             "documents": documents,
-            "total": len(documents)
+            "total": len(documents),
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting documents: {e}")
         raise HTTPException(
@@ -94,97 +102,69 @@ async def upload_document(
     file: UploadFile = File(...),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Upload and process a document with AI text extraction"""
+    """Upload a document and queue it for AI text extraction and embedding"""
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        logger.info(f"Uploading document: {file.filename}, type: {file.content_type}, size: {len(file_content)} bytes")
-        
         # Generate document ID
         doc_id = str(uuid.uuid4())
         
-        # Save file to storage
+        # Stream file to storage without holding it in memory
         try:
-            file_path = save_uploaded_file(file_content, file.filename, doc_id)
-            logger.info(f"File saved to: {file_path}")
+            tmp_path, file_size, content_hash = await content_store.stage_upload(file)
         except Exception as e:
             logger.error(f"Failed to save file: {e}")
             raise HTTPException(status_code=500, detail="Failed to save file")
         
-        # Extract text content using document processor
-        extracted_text, extraction_metadata = await document_processor.extract_text(
-            file_content, 
-            file.content_type, 
-            file.filename
-        )
-        
-        # Create document record with processing status and file path
-        document_data = {
-            "id": doc_id,
-            "title": file.filename,
-            "file_type": file.content_type,
-            "file_size": len(file_content),
-            "file_path": file_path,  # Add file path
-            "uploaded_by": current_user["id"],
-            "content": extracted_text if extracted_text else None,
-            "processing_status": "pending" if extracted_text else "failed",
-            "error_message": extraction_metadata.get("error") if not extracted_text else None
-        }
-        
-        # Save document to database
-        result = await db_manager.create_document(document_data)
+        # Store the file once per content hash; the document row is its reference
+        async with content_store.lock(content_hash):
+            try:
+                file_path = content_store.commit(tmp_path, content_hash)
+            except Exception as e:
+                logger.error(f"Failed to store file: {e}")
+                tmp_path.unlink(missing_ok=True)
+                raise HTTPException(status_code=500, detail="Failed to save file")
+            logger.info(f"Uploaded document: {file.filename}, type: {file.content_type}, size: {file_size} bytes, saved to: {file_path}")
+            
+            # Create document record; extraction and embedding happen in the ingestion queue
+            document_data = {
+                "id": doc_id,
+                "title": file.filename,
+                "file_type": file.content_type,
+                "file_size": file_size,
+                "file_path": file_path,  # Add file path
+                "content_hash": content_hash,
+                "uploaded_by": current_user["id"],
+                "processing_status": "pending"
+            }
+            
+            # Save document to database
+            result = await db_manager.create_document(document_data)
         
         if not result:
+            await content_store.release(content_hash)
             raise HTTPException(status_code=500, detail="Failed to save document")
         
-        # Process document content with AI if text was extracted successfully
-        processing_result = None
-        if extracted_text and extracted_text.strip():
-            logger.info(f"Processing extracted text ({len(extracted_text)} characters) with AI")
-            
-            # Update processing status
-            await db_manager.update_document(doc_id, {"processing_status": "processing"})
-            
-            processing_result = await ai_service.process_document_content(
-                extracted_text,
-                doc_id,
-                {
-                    "filename": file.filename,
-                    "file_type": file.content_type,
-                    "uploaded_by": current_user["id"],
-                    "extraction_metadata": extraction_metadata
-                }
-            )
-            
-            # Update processing status based on result
-            if processing_result and processing_result.get("success"):
-                await db_manager.update_document(doc_id, {
-                    "processing_status": "completed",
-                    "processed_at": db_manager.get_timestamp(),
-                    "chunk_count": processing_result.get("processed_chunks", 0)
-                })
-                logger.info(f"Document {doc_id} processed successfully with {processing_result.get('processed_chunks', 0)} chunks")
-            else:
-                await db_manager.update_document(doc_id, {
-                    "processing_status": "failed",
-                    "error_message": processing_result.get("error") if processing_result else "Processing failed"
-                })
-                logger.error(f"Document {doc_id} processing failed: {processing_result.get('error') if processing_result else 'Unknown error'}")
+        job = await ingestion_queue.enqueue(
+            doc_id,
+            file_path,
+            file.filename,
+            file.content_type,
+            current_user["id"],
+            content_hash
+        )
         
         return {
-            "message": "Document uploaded successfully",
+            "message": "Document uploaded successfully, processing started",
             "document_id": doc_id,
+            "job_id": job["job_id"],
             "filename": file.filename,
-            "size": len(file_content),
+            "size": file_size,
             "content_type": file.content_type,
-            "text_extracted": bool(extracted_text and extracted_text.strip()),
-            "extraction_metadata": extraction_metadata,
-            "ai_processed": processing_result.get("success", False) if processing_result else False,
-            "chunks_created": processing_result.get("processed_chunks", 0) if processing_result else 0,
-            "processing_status": "completed" if (processing_result and processing_result.get("success")) else ("failed" if extracted_text else "no_text")
+            "processing_status": "pending",
+            "status_url": f"/api/documents/jobs/{job['job_id']}"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(
@@ -192,6 +172,84 @@ async def upload_document(
             detail=f"Failed to upload document: {str(e)}"
         )
 
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get the progress of a document ingestion job"""
+    job = ingestion_queue.get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return {
+        "job_id": job["job_id"],
+        "document_id": job["document_id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "chunks_created": job["chunks_created"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+# OneDrive integration endpoints (declared before /{document_id}/status, which would match them)
+@router.get("/onedrive/status")
+async def check_onedrive_status(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Check OneDrive connection status"""
+    try:
+        has_token = bool(current_user.get("microsoft_access_token"))
+        
+        return {
+            "connected": has_token,
+            "user_email": current_user.get("email"),
+            "status": "connected" if has_token else "not_connected"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error checking OneDrive status: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to check OneDrive status"
+        )
+
+@router.get("/{document_id}/status")
+async def get_document_status(
+    document_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get the processing status of a document"""
+    try:
+        document = await db_manager.get_document_by_id(document_id)
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        if document.get("uploaded_by") != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        return {
+            "document_id": document_id,
+            "processing_status": document.get("processing_status"),
+            "chunk_count": document.get("chunk_count", 0),
+            "processed_at": document.get("processed_at"),
+            "error_message": document.get("error_message")
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting document status: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve document status"
+        )
+
 @router.post("/process-onedrive")
 async def process_onedrive_document(
     request_data: ProcessDocumentRequest,
@@ -214,26 +272,63 @@ async def process_onedrive_document(
         
         content_to_process = document.get("content")
         
-        # If no content but has OneDrive URL, try to fetch content
-        if not content_to_process and document.get("onedrive_download_url"):
+        # No extracted text yet: fetch the file and queue it for extraction like an upload
+        if not content_to_process:
+            access_token = current_user.get("microsoft_access_token")
+            if not access_token:
+                raise HTTPException(status_code=400, detail="OneDrive not connected")
+            
             try:
-                # Get OneDrive access token for user
-                access_token = current_user.get("microsoft_access_token")
-                if not access_token:
-                    raise HTTPException(status_code=400, detail="OneDrive not connected")
-                
-                # Download file content
-                headers = {"Authorization": f"Bearer {access_token}"}
-                response = requests.get(document["onedrive_download_url"], headers=headers)
-                
-                if response.status_code == 200:
-                    content_to_process = response.text
-                else:
-                    raise HTTPException(status_code=400, detail="Failed to download OneDrive file")
-                    
+                tmp_path, file_size, content_hash, served_type = await onedrive_client.download(
+                    document["onedrive_download_url"],
+                    access_token,
+                    current_user["id"],
+                    content_store.tmp_dir
+                )
+            except TooManyDownloads as e:
+                raise HTTPException(status_code=429, detail=str(e))
             except Exception as e:
                 logger.error(f"Error downloading OneDrive content: {e}")
-                raise HTTPException(status_code=500, detail="Failed to process OneDrive document")
+                raise HTTPException(status_code=502, detail="Failed to download OneDrive file")
+            
+            # Prefer the type recorded at sync; fall back to what OneDrive served
+            content_type = document.get("file_type")
+            if not content_type or content_type == "application/octet-stream":
+                content_type = served_type or content_type
+            
+            async with content_store.lock(content_hash):
+                file_path = content_store.commit(tmp_path, content_hash)
+                updated = await db_manager.update_document(request_data.document_id, {
+                    "file_path": file_path,
+                    "file_size": file_size,
+                    "content_hash": content_hash,
+                    "file_type": content_type,
+                    "processing_status": "pending"
+                })
+            
+            if not updated:
+                await content_store.release(content_hash)
+                raise HTTPException(status_code=500, detail="Failed to save document")
+            if document.get("file_path") and document.get("content_hash") != content_hash:
+                # The file fetched on an earlier attempt is no longer referenced by this row
+                await content_store.release_document(document)
+            
+            job = await ingestion_queue.enqueue(
+                request_data.document_id,
+                file_path,
+                document.get("title", "Unknown"),
+                content_type,
+                current_user["id"],
+                content_hash
+            )
+            
+            return {
+                "message": "OneDrive document downloaded, processing started",
+                "document_id": request_data.document_id,
+                "job_id": job["job_id"],
+                "processing_status": "pending",
+                "status_url": f"/api/documents/jobs/{job['job_id']}"
+            }
         
         # Process document with AI
         processing_result = await ai_service.process_document_content(
@@ -315,15 +410,87 @@ async def get_document(
             detail="Failed to retrieve document"
         )
 
+# Fields kept in the download metadata cache (never the extracted content)
+DOCUMENT_FILE_FIELDS = ("id", "title", "file_type", "file_path", "content_hash", "uploaded_by")
+
+async def get_document_file(document_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[os.stat_result]]:
+    """Get a document's file metadata and stat, cached briefly for repeat views
+
+    Returns (None, None) if the document doesn't exist and (document, None) if its file is missing
+    """
+    cached = document_file_cache.get(document_id)
+    if cached is not None:
+        return cached
+
+    document = await db_manager.get_document_by_id(document_id)
+    if not document:
+        return None, None
+    document = {field: document.get(field) for field in DOCUMENT_FILE_FIELDS}
+
+    file_path = document.get("file_path")
+    try:
+        stat_result = os.stat(file_path) if file_path else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
+        return document, None
+
+    document_file_cache.set(document_id, (document, stat_result))
+    return document, stat_result
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def document_file_response(
+    request: Request,
+    document: Dict[str, Any],
+    stat_result: os.stat_result,
+    disposition: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Build a cacheable file response, answering conditional GETs with 304
+
+    Files are addressed by their SHA-256, so the hash is a strong ETag: browsers
+    reuse their copy until max-age, then revalidate for a bodyless 304. Range
+    requests (and If-Range) are handled by FileResponse, so PDF viewers can fetch
+    only the pages they display.
+    """
+    headers = dict(headers or {})
+    content_hash = document.get("content_hash")
+    if content_hash:
+        etag = f'"{content_hash}"'
+        headers["ETag"] = etag
+        headers["Cache-Control"] = f"private, max-age={settings.file_cache_max_age_seconds}"
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    else:
+        # Older rows have no hash; FileResponse's mtime/size ETag still allows revalidation
+        headers["Cache-Control"] = "private, no-cache"
+
+    return FileResponse(
+        path=document["file_path"],
+        filename=document.get("title") or "document",
+        media_type=document.get("file_type") or "application/octet-stream",
+        headers=headers,
+        stat_result=stat_result,
+        content_disposition_type=disposition
+    )
+
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: str,
+    request: Request,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """Download a specific document file"""
     try:
-        # Get document from database
-        document = await db_manager.get_document_by_id(document_id)
+        # Get document file metadata (cached briefly)
+        document, stat_result = await get_document_file(document_id)
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -331,17 +498,11 @@ async def download_document(
         if document.get("uploaded_by") != current_user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Check if file exists
-        file_path = document.get("file_path")
-        if not file_path or not os.path.exists(file_path):
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="File not found in storage")
         
-        # Return file for download
-        return FileResponse(
-            path=file_path,
-            filename=document.get("title", "document"),
-            media_type=document.get("file_type", "application/octet-stream")
-        )
+        # Return file for download, honouring Range and If-None-Match
+        return document_file_response(request, document, stat_result, "attachment")
         
     except HTTPException:
         raise
@@ -404,13 +565,13 @@ async def serve_document(
         if not user_email:
             raise HTTPException(status_code=401, detail="No user email provided")
         
-        # Get user from database
-        user = await db_manager.get_user_by_email(user_email)
+        # Get user through the shared user cache
+        user = await get_user_by_email(user_email)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get document from database
-        document = await db_manager.get_document_by_id(document_id)
+        # Get document file metadata (cached briefly)
+        document, stat_result = await get_document_file(document_id)
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -418,19 +579,20 @@ async def serve_document(
         if document.get("uploaded_by") != user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Check if file exists
-        file_path = document.get("file_path")
-        if not file_path or not os.path.exists(file_path):
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="File not found in storage")
         
-        # Return file for inline viewing
-        return FileResponse(
-            path=file_path,
-            media_type=document.get("file_type", "application/octet-stream"),
+        # Return file for inline viewing; PDF viewers fetch it in byte ranges
+        return document_file_response(
+            request,
+            document,
+            stat_result,
+            "inline",  # This makes it display in browser instead of download
             headers={
-                "Content-Disposition": "inline",  # This makes it display in browser instead of download
                 "Access-Control-Allow-Origin": "*",  # Allow iframe embedding
-                "Access-Control-Allow-Headers": "*"
+                "Access-Control-Allow-Headers": "*",
+                # Let cross-origin viewers read range and validator headers
+                "Access-Control-Expose-Headers": "Accept-Ranges, Content-Range, Content-Length, ETag"
             }
         )
         
@@ -443,15 +605,16 @@ async def serve_document(
             detail="Failed to serve document"
         )
 
-@router.delete("/{document_id}")
+@router.delete("/{document_id}", status_code=status.HTTP_202_ACCEPTED)
 async def delete_document(
     document_id: str,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Delete a document and its chunks"""
+    """Delete a document, its chunks and its stored file in the background"""
     try:
         # Get document to verify ownership
-        document = await db_manager.get_document_by_id(document_id)
+        documents = await db_manager.get_documents_by_ids([document_id])
+        document = documents[0] if documents else None
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -459,15 +622,12 @@ async def delete_document(
         if document.get("uploaded_by") != current_user["id"]:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Delete document chunks first (due to foreign key constraint)
-        db_manager.client.table("document_chunks").delete().eq("document_id", document_id).execute()
-        
-        # Delete document
-        result = db_manager.client.table("documents").delete().eq("id", document_id).execute()
+        await document_deleter.schedule([document])
         
         return {
-            "message": "Document deleted successfully",
-            "document_id": document_id
+            "message": "Document deletion started",
+            "document_id": document_id,
+            "processing_status": "deleting"
         }
         
     except HTTPException:
@@ -479,22 +639,39 @@ async def delete_document(
             detail="Failed to delete document"
         )
 
-# OneDrive integration endpoints
-@router.get("/onedrive/status")
-async def check_onedrive_status(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Check OneDrive connection status"""
+@router.post("/bulk-delete", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_delete_documents(
+    request_data: BulkDeleteRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Delete many documents at once, in the background"""
     try:
-        has_token = bool(current_user.get("microsoft_access_token"))
+        document_ids = list(dict.fromkeys(request_data.document_ids))
+        if not document_ids:
+            raise HTTPException(status_code=400, detail="No document IDs provided")
+        if len(document_ids) > MAX_BULK_DELETE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DELETE} documents can be deleted at once")
+        
+        # Other users' documents are reported as not found
+        documents = [
+            document for document in await db_manager.get_documents_by_ids(document_ids)
+            if document.get("uploaded_by") == current_user["id"]
+        ]
+        found_ids = {document["id"] for document in documents}
+        
+        await document_deleter.schedule(documents)
         
         return {
-            "connected": has_token,
-            "user_email": current_user.get("email"),
-            "status": "connected" if has_token else "not_connected"
+            "message": f"Deletion started for {len(documents)} documents",
+            "deleting": [document_id for document_id in document_ids if document_id in found_ids],
+            "not_found": [document_id for document_id in document_ids if document_id not in found_ids]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error checking OneDrive status: {e}")
+        logger.error(f"Error bulk deleting documents: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to check OneDrive status"
+            detail="Failed to delete documents"
         )
\ No newline at end of file
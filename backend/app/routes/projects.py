@@ -5,7 +5,7 @@ import logging
 import uuid
 
 from ..database import db_manager
-from .assignments import get_current_user
+from ..dependencies import get_current_user
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,142 @@
+# Content-addressed file storage for uploaded documents
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from fastapi import UploadFile
+
+from .config import settings
+from .database import db_manager
+
+logger = logging.getLogger(__name__)
+
+class ContentStore:
+    """
+    Stores each distinct file once, at <root>/<aa>/<bb>/<sha256>
+
+    The references to a stored file are the documents rows with its content_hash,
+    so a file is removed when the last of those rows is deleted. Storing a file
+    and recording its row happen under a per-hash lock, as do counting references
+    and removing the file, so a release can't delete a file an upload is about to
+    reference. The lock is per process; workers sharing one directory can still
+    race on a release, which at worst costs a re-upload.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        # Per-hash lock and the number of tasks holding or waiting for it
+        self._locks: Dict[str, List] = {}
+
+    def path_for(self, content_hash: str) -> Path:
+        """Get the storage path of a file by its SHA-256"""
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def is_stored(self, file_path: str) -> bool:
+        """Check whether a path points into the content-addressed layout"""
+        path = Path(file_path)
+        return path.parent.parent.parent == self.root and len(path.name) == 64
+
+    @asynccontextmanager
+    async def lock(self, content_hash: str):
+        """Hold the lock for one stored file"""
+        entry = self._locks.get(content_hash)
+        if entry is None:
+            entry = self._locks[content_hash] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[content_hash]
+
+    async def stage_upload(self, file: UploadFile) -> Tuple[Path, int, str]:
+        """Spool an upload to a temporary file in chunks, hashing it on the way
+
+        Returns (temporary path, size in bytes, SHA-256 hex digest)
+        """
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        hasher = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await file.read(settings.upload_chunk_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+        except Exception as e:
+            logger.error(f"Error staging upload: {e}")
+            tmp_path.unlink(missing_ok=True)
+            raise e
+
+        return tmp_path, size, hasher.hexdigest()
+
+    def commit(self, tmp_path: Path, content_hash: str) -> str:
+        """Move a staged file into place, or drop it if the same content is already stored
+
+        Call while holding lock(content_hash). Returns the storage path.
+        """
+        path = self.path_for(content_hash)
+        if path.exists():
+            tmp_path.unlink(missing_ok=True)
+            logger.info(f"Reusing stored file {content_hash}")
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return str(path)
+
+    async def release(self, content_hash: str) -> bool:
+        """Remove a stored file if no documents reference it any more
+
+        Returns True if the file was removed.
+        """
+        async with self.lock(content_hash):
+            references = await db_manager.count_documents_by_hash(content_hash)
+            if references != 0:
+                # Still referenced, or unknown because the count failed
+                return False
+            try:
+                self.path_for(content_hash).unlink()
+            except FileNotFoundError:
+                return False
+            logger.info(f"Removed stored file {content_hash}")
+            return True
+
+    async def release_document(self, document: Dict[str, Any]) -> bool:
+        """Reclaim the file of a deleted document
+
+        Content-addressed files are released by hash; files stored per document
+        before content addressing are removed outright. Returns True if a file was removed.
+        """
+        file_path = document.get("file_path")
+        content_hash = document.get("content_hash")
+        if not file_path:
+            return False
+        if content_hash and self.is_stored(file_path):
+            return await self.release(content_hash)
+
+        path = Path(file_path)
+        if path.parent != self.root:
+            # Not a file this store owns
+            return False
+        try:
+            await asyncio.to_thread(path.unlink)
+        except FileNotFoundError:
+            return False
+        logger.info(f"Removed stored file {file_path}")
+        return True
+
+# Global content store instance
+content_store = ContentStore(settings.storage_path)
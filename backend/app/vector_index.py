@@ -0,0 +1,365 @@
+# Local in-process vector index over document chunk embeddings
+import asyncio
+import json
+import logging
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+import numpy as np
+
+from .config import settings
+from .database import db_manager, parse_timestamp
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class LocalVectorIndex:
+    """
+    Memory-mapped float32 matrix of chunk embeddings, searched in-process
+
+    The index directory belongs to one process: it is locked on load, so each
+    worker needs its own LOCAL_INDEX_PATH. New chunks are pulled from
+    document_chunks and deletions from the deleted_documents log
+    (sql/create_deleted_documents_log.sql), so every worker's index follows
+    changes made by the others.
+
+    created_at is stamped before a chunk's insert commits, so a chunk can become
+    visible after later ones have been synced. Each sync re-scans a trailing
+    window before its cursor and skips chunks already in the index.
+    """
+
+    def __init__(self, directory: str, dimension: int = 1536):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.count = 0
+        self.capacity = 0
+        self.last_synced_at: Optional[str] = None
+        self.last_synced_id: Optional[str] = None
+        self.last_deletion_id: Optional[int] = None
+        # Row metadata is kept in memory; the vectors live in the memory map
+        self.rows: List[Dict[str, Any]] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.alive: np.ndarray = np.zeros(0, dtype=bool)
+        self.matrix: Optional[np.memmap] = None
+        self.ann = None
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.directory / "embeddings.f32"
+
+    @property
+    def _rows_path(self) -> Path:
+        return self.directory / "rows.jsonl"
+
+    @property
+    def _state_path(self) -> Path:
+        return self.directory / "state.json"
+
+    def _lock_directory(self):
+        """Take an exclusive lock on the index directory for this process"""
+        if fcntl is None:
+            return
+        self._lock_file = open(self.directory / "lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                f"Local vector index at {self.directory} is in use by another process; "
+                "give each worker its own LOCAL_INDEX_PATH"
+            )
+
+    def load(self):
+        """Load the index from disk, or start an empty one"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_directory()
+        deleted_ids = set()
+        if self._state_path.exists():
+            state = json.loads(self._state_path.read_text())
+            if state.get("dimension") == self.dimension:
+                self.count = state["count"]
+                self.last_synced_at = state.get("last_synced_at")
+                self.last_synced_id = state.get("last_synced_id")
+                self.last_deletion_id = state.get("last_deletion_id")
+                deleted_ids = set(state.get("deleted_ids", []))
+            else:
+                logger.warning("Local vector index dimension changed, rebuilding from scratch")
+
+        if self.count and self._rows_path.exists():
+            with open(self._rows_path) as f:
+                self.rows = [json.loads(line) for line, _ in zip(f, range(self.count))]
+            self.count = len(self.rows)
+        else:
+            self.count = 0
+            self.rows = []
+            self._rows_path.write_text("")
+
+        self.row_by_id = {row["id"]: i for i, row in enumerate(self.rows)}
+        self._resize(max(self.count, 1024))
+        self.alive = np.ones(self.capacity, dtype=bool)
+        self.alive[self.count:] = False
+        for chunk_id in deleted_ids:
+            if chunk_id in self.row_by_id:
+                self.alive[self.row_by_id[chunk_id]] = False
+
+        if hnswlib and settings.local_index_use_hnsw:
+            self._build_ann()
+        logger.info(f"Local vector index loaded with {int(self.alive.sum())} chunks")
+
+    def _resize(self, capacity: int):
+        """Grow the memory-mapped matrix file to hold at least `capacity` rows"""
+        if capacity <= self.capacity:
+            return
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        self.capacity = capacity
+
+    def _build_ann(self):
+        """Build the optional HNSW index over the live rows"""
+        self.ann = hnswlib.Index(space="ip", dim=self.dimension)
+        self.ann.init_index(max_elements=self.capacity, ef_construction=200, M=16, allow_replace_deleted=True)
+        live_rows = np.flatnonzero(self.alive[:self.count])
+        if len(live_rows):
+            self.ann.add_items(self.matrix[live_rows], live_rows)
+        self.ann.set_ef(settings.local_index_ef_search)
+
+    def _save_state(self):
+        deleted_ids = [row["id"] for i, row in enumerate(self.rows) if not self.alive[i]]
+        self._state_path.write_text(json.dumps({
+            "dimension": self.dimension,
+            "count": self.count,
+            "last_synced_at": self.last_synced_at,
+            "last_synced_id": self.last_synced_id,
+            "last_deletion_id": self.last_deletion_id,
+            "deleted_ids": deleted_ids
+        }))
+
+    @staticmethod
+    def _parse_embedding(embedding: Any) -> Optional[List[float]]:
+        # pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings
+        if isinstance(embedding, str):
+            return json.loads(embedding)
+        return embedding
+
+    def _append(self, chunks: List[Dict[str, Any]]) -> int:
+        """Add synced chunk rows to the matrix, skipping chunks it already holds
+
+        Returns the number of rows added.
+        """
+        with self._lock:
+            new_rows = []
+            vectors = []
+            for chunk in chunks:
+                # Chunks are never updated, so a known ID is either indexed or was evicted
+                if chunk["id"] in self.row_by_id:
+                    continue
+                embedding = self._parse_embedding(chunk.get("embedding"))
+                if not embedding or len(embedding) != self.dimension:
+                    continue
+                document = chunk.get("documents") or {}
+                vectors.append(embedding)
+                new_rows.append({
+                    "id": chunk["id"],
+                    "document_id": chunk["document_id"],
+                    "content": chunk["content"],
+                    "chunk_index": chunk.get("chunk_index"),
+                    "metadata": chunk.get("metadata") or {},
+                    "document_title": document.get("title", "Unknown"),
+                    "document_file_type": document.get("file_type", "unknown")
+                })
+
+            if new_rows:
+                matrix = np.asarray(vectors, dtype=np.float32)
+                # Normalize so inner product equals cosine similarity
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix /= np.where(norms == 0, 1, norms)
+
+                if self.count + len(new_rows) > self.capacity:
+                    self._resize(max(self.capacity * 2, self.count + len(new_rows)))
+                    if self.ann is not None:
+                        self.ann.resize_index(self.capacity)
+
+                start = self.count
+                positions = np.arange(start, start + len(new_rows))
+                self.matrix[positions] = matrix
+                self.matrix.flush()
+                self.alive[positions] = True
+                for position, row in zip(positions, new_rows):
+                    self.row_by_id[row["id"]] = int(position)
+                self.rows.extend(new_rows)
+                self.count += len(new_rows)
+                if self.ann is not None:
+                    self.ann.add_items(matrix, positions)
+
+                with open(self._rows_path, "a") as f:
+                    for row in new_rows:
+                        f.write(json.dumps(row) + "\n")
+
+            # Pages of a re-scan can lie behind the cursor; it only moves forward
+            if chunks and (
+                self.last_synced_at is None
+                or parse_timestamp(chunks[-1]["created_at"]) >= parse_timestamp(self.last_synced_at)
+            ):
+                self.last_synced_at = chunks[-1]["created_at"]
+                self.last_synced_id = chunks[-1]["id"]
+            self._save_state()
+            return len(new_rows)
+
+    def _sync_start(self) -> Optional[str]:
+        """Timestamp to re-scan from: the cursor minus the sync overlap window"""
+        synced_at = parse_timestamp(self.last_synced_at)
+        if synced_at is None:
+            return None
+        return (synced_at - timedelta(seconds=settings.local_index_sync_overlap_seconds)).isoformat()
+
+    async def sync(self) -> int:
+        """Pull chunks created and documents deleted since the last sync"""
+        async with self._sync_lock:
+            batch_size = settings.local_index_sync_batch_size
+            synced = 0
+            after_created_at, after_id = self._sync_start(), None
+            while True:
+                chunks = await db_manager.get_chunks_since(after_created_at, after_id, batch_size)
+                if not chunks:
+                    break
+                synced += await asyncio.to_thread(self._append, chunks)
+                after_created_at, after_id = chunks[-1]["created_at"], chunks[-1]["id"]
+                if len(chunks) < batch_size:
+                    break
+
+            removed = 0
+            while True:
+                deletions = await db_manager.get_deleted_documents_since(self.last_deletion_id, batch_size)
+                if not deletions:
+                    break
+                removed += await asyncio.to_thread(self._apply_deletions, deletions)
+                if len(deletions) < batch_size:
+                    break
+
+            if synced or removed:
+                logger.info(f"Synced {synced} chunks into the local vector index, removed {removed}")
+            return synced
+
+    def _remove_documents(self, document_ids: Set[str]) -> int:
+        """Mark every live row of the given documents as deleted; call with the lock held"""
+        removed = 0
+        for position, row in enumerate(self.rows):
+            if row["document_id"] in document_ids and self.alive[position]:
+                self.alive[position] = False
+                if self.ann is not None:
+                    self.ann.mark_deleted(position)
+                removed += 1
+        return removed
+
+    def _apply_deletions(self, deletions: List[Dict[str, Any]]) -> int:
+        """Evict documents from the deleted-documents log and advance the log position"""
+        with self._lock:
+            removed = self._remove_documents({entry["document_id"] for entry in deletions})
+            self.last_deletion_id = deletions[-1]["id"]
+            self._save_state()
+            return removed
+
+    def remove_document(self, document_id: str) -> int:
+        """Evict all chunks of a document from the index"""
+        with self._lock:
+            removed = self._remove_documents({document_id})
+            if removed:
+                self._save_state()
+            return removed
+
+    def search(self, query_embedding: List[float], limit: int = 5, match_threshold: float = 0.7) -> List[Dict[str, Any]]:
+        """Find the chunks most similar to the query embedding"""
+        return self.search_many([query_embedding], limit, match_threshold)[0]
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        limit: int = 5,
+        match_threshold: float = 0.7
+    ) -> List[List[Dict[str, Any]]]:
+        """Find the chunks most similar to each query embedding, in one pass over the index"""
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        if not query_embeddings or self.count == 0:
+            return results
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            live_count = int(self.alive[:self.count].sum())
+            if not live_count:
+                return results
+            k = min(limit, live_count)
+
+            if self.ann is not None:
+                positions, distances = self.ann.knn_query(queries, k=k)
+                scores = 1 - distances
+            else:
+                scores = queries @ self.matrix[:self.count].T
+                scores[:, ~self.alive[:self.count]] = -np.inf
+                positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, positions, axis=1)
+                order = np.argsort(-scores, axis=1)
+                positions = np.take_along_axis(positions, order, axis=1)
+                scores = np.take_along_axis(scores, order, axis=1)
+
+            for query_num in range(len(queries)):
+                if norms[query_num, 0] == 0:
+                    continue
+                for position, score in zip(positions[query_num], scores[query_num]):
+                    if score <= match_threshold:
+                        continue
+                    row = self.rows[int(position)]
+                    results[query_num].append({**row, "similarity": float(score)})
+            return results
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing local vector index: {e}")
+            await asyncio.sleep(settings.local_index_sync_seconds)
+
+    async def start(self):
+        """Load the index and keep it in sync in the background"""
+        await asyncio.to_thread(self.load)
+        self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        """Stop background syncing and flush the matrix"""
+        if self._sync_task:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+        if self.matrix is not None:
+            self.matrix.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+# Global local vector index instance
+vector_index = LocalVectorIndex(settings.local_index_path)
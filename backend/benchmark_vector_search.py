@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the index-backed vector search against the original function
+Uses stored chunk embeddings as queries, treats match_document_chunks (a full scan)
+as ground truth, and reports recall@k and latency of match_document_chunks_v2
+at several ef_search settings
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from app.database import db_manager
+
+
+async def timed_rpc(function_name: str, params: dict):
+    """Call a search function and return (chunk ids, latency in ms)"""
+    start = time.perf_counter()
+    result = await db_manager._execute(db_manager.client.rpc(function_name, params))
+    elapsed = (time.perf_counter() - start) * 1000
+    return [row["id"] for row in result.data or []], elapsed
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return statistics.median(latencies), p95
+
+
+async def run_benchmark(queries: int, k: int, ef_values):
+    print("Vector Search Benchmark")
+    print("=" * 60)
+
+    await db_manager.initialize()
+
+    # Sample stored embeddings to use as queries
+    sample = await db_manager.get_chunks_since(None, None, max(queries * 5, 200))
+    embeddings = []
+    for chunk in sample:
+        embedding = chunk.get("embedding")
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        if embedding:
+            embeddings.append(embedding)
+    if not embeddings:
+        print("No chunk embeddings found to benchmark with")
+        return
+    embeddings = random.sample(embeddings, min(queries, len(embeddings)))
+    print(f"Queries: {len(embeddings)}, k: {k}")
+
+    # Ground truth from the original full-scan function (threshold -1 keeps every row eligible)
+    truth = []
+    baseline_latencies = []
+    for embedding in embeddings:
+        ids, elapsed = await timed_rpc("match_document_chunks", {
+            "query_embedding": embedding,
+            "match_threshold": -1,
+            "match_count": k
+        })
+        truth.append(set(ids))
+        baseline_latencies.append(elapsed)
+
+    p50, p95 = summarize(baseline_latencies)
+    print(f"\n{'function':<32}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'match_document_chunks':<32}{1.0:>10.3f}{p50:>10.1f}{p95:>10.1f}")
+
+    for ef_search in ef_values:
+        recalls = []
+        latencies = []
+        for embedding, expected in zip(embeddings, truth):
+            ids, elapsed = await timed_rpc("match_document_chunks_v2", {
+                "query_embedding": embedding,
+                "match_threshold": -1,
+                "match_count": k,
+                "ef_search": ef_search
+            })
+            latencies.append(elapsed)
+            if expected:
+                recalls.append(len(expected & set(ids)) / len(expected))
+        p50, p95 = summarize(latencies)
+        recall = statistics.mean(recalls) if recalls else 0.0
+        print(f"{f'match_document_chunks_v2 ef={ef_search}':<32}{recall:>10.3f}{p50:>10.1f}{p95:>10.1f}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 100, 200])
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.queries, args.k, args.ef_search))
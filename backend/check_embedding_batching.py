@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Check the batched embedding pipeline against a local fake embedding server
+Starts an OpenAI-compatible /v1/embeddings endpoint on localhost, points the AI
+service at it through OPENAI_BASE_URL, and checks that many chunks are embedded
+in a handful of requests, that results land on the right chunks, and that a failed
+batch fails the document instead of storing zero vectors
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMENSION = 1536
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    """Answers embeddings requests with vectors whose first value is the input's length"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeEmbeddingHandler)
+        self.batch_sizes = []
+        self.fail_from_request = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        server = self.server
+        server.batch_sizes.append(len(inputs))
+
+        if server.fail_from_request is not None and len(server.batch_sizes) >= server.fail_from_request:
+            # 400 is not retried by the client, so the failure surfaces immediately
+            self._send(400, {"error": {"message": "fake failure", "type": "invalid_request_error"}})
+            return
+
+        data = [
+            {"object": "embedding", "index": i, "embedding": [float(len(text))] + [0.0] * (DIMENSION - 1)}
+            for i, text in enumerate(inputs)
+        ]
+        # Out of order on purpose: results must be matched by index
+        data.reverse()
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        })
+
+    def _send(self, status: int, payload: dict):
+        blob = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(blob)))
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def run_check(chunks: int, batch_size: int) -> bool:
+    server = FakeEmbeddingServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Settings are read at import time
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["EMBEDDING_BATCH_SIZE"] = str(batch_size)
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    from app.ai_service import AIService
+    from app.database import db_manager
+
+    stored_rows = []
+
+    async def create_document_chunks(rows):
+        stored_rows.extend(rows)
+        return rows
+
+    db_manager.create_document_chunks = create_document_chunks
+    service = AIService()
+
+    print("Embedding Batching Check")
+    print("=" * 50)
+    passed = True
+
+    # Distinct lengths, so each vector identifies its text
+    texts = [f"chunk {i} " + "x" * i for i in range(chunks)]
+    embeddings = await service.create_embeddings(texts)
+    expected_requests = -(-chunks // batch_size)
+    print(f"Texts embedded:       {len(texts)}")
+    print(f"Requests made:        {len(server.batch_sizes)} (expected {expected_requests})")
+    if len(server.batch_sizes) != expected_requests or max(server.batch_sizes) > batch_size:
+        print("FAIL: batches don't follow EMBEDDING_BATCH_SIZE")
+        passed = False
+    if [embedding[0] for embedding in embeddings] != [float(len(text)) for text in texts]:
+        print("FAIL: embeddings were matched to the wrong texts")
+        passed = False
+
+    # A failing batch must fail the document rather than store zero vectors
+    server.batch_sizes.clear()
+    server.fail_from_request = 2
+    result = await service.process_document_content(
+        "\n\n".join(f"Paragraph {i}. " + "word " * 200 for i in range(chunks)),
+        "check-document",
+        {"filename": "check.txt"}
+    )
+    print(f"Failed-batch result:  success={result['success']}, rows stored={len(stored_rows)}")
+    if result["success"] or stored_rows:
+        print("FAIL: a failed embedding batch still produced stored chunks")
+        passed = False
+
+    server.shutdown()
+    print("=" * 50)
+    print("PASS: embeddings are batched and failures fail the document" if passed else "FAIL")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    passed = asyncio.run(run_check(args.chunks, args.batch_size))
+    raise SystemExit(0 if passed else 1)
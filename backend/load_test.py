@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Load test for the async request path
+Sends a mix of /api/chat/ and /api/documents/ requests to a running server, first
+one at a time as a baseline and then all at once, and reports whether the concurrent
+run overlaps them or serializes on the event loop
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def timed_request(client: httpx.AsyncClient, method: str, path: str, **kwargs) -> float:
+    """Send one request and return its latency in seconds"""
+    start = time.perf_counter()
+    response = await client.request(method, path, **kwargs)
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 400:
+        print(f"  - {method} {path} -> {response.status_code}")
+    return elapsed
+
+
+async def run_load_test(base_url: str, user_email: str, concurrency: int):
+    """Run the same mix of requests sequentially and concurrently"""
+    print("Async Request Path Load Test")
+    print("=" * 50)
+
+    headers = {"x-user-email": user_email}
+    requests_mix = []
+    for i in range(concurrency):
+        if i % 2 == 0:
+            requests_mix.append(("POST", "/api/chat/", {"json": {"message": f"What assignments do I have? ({i})"}}))
+        else:
+            requests_mix.append(("GET", "/api/documents/", {}))
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120) as client:
+        # Warm up connections and caches
+        await timed_request(client, "GET", "/health")
+
+        # Sequential baseline: one request at a time
+        start = time.perf_counter()
+        for method, path, kwargs in requests_mix:
+            await timed_request(client, method, path, **kwargs)
+        sequential_time = time.perf_counter() - start
+
+        # Concurrent run
+        start = time.perf_counter()
+        latencies = await asyncio.gather(
+            *(timed_request(client, method, path, **kwargs) for method, path, kwargs in requests_mix)
+        )
+        wall_time = time.perf_counter() - start
+
+    serial_time = sum(latencies)
+    overlap = serial_time / wall_time if wall_time else 0
+    speedup = sequential_time / wall_time if wall_time else 0
+
+    print(f"Requests sent:        {len(requests_mix)} (each run)")
+    print(f"Sequential time:      {sequential_time:.2f}s")
+    print(f"Concurrent time:      {wall_time:.2f}s")
+    print(f"Speedup:              {speedup:.1f}x")
+    print(f"Sum of latencies:     {serial_time:.2f}s")
+    print(f"Slowest request:      {max(latencies):.2f}s")
+    print(f"Overlap factor:       {overlap:.1f}x")
+    print("=" * 50)
+
+    # If the event loop were blocked, the concurrent run would take as long as the sequential one
+    if speedup < 1.5 or overlap < 1.5:
+        print("FAIL: requests are serializing on the server")
+        return False
+    print("PASS: requests are served concurrently")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--user-email", required=True, help="Email of an existing user")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    passed = asyncio.run(run_load_test(args.base_url, args.user_email, args.concurrency))
+    raise SystemExit(0 if passed else 1)
@@ -13,6 +13,7 @@ sys.path.append('app')
 from app.database import db_manager
 from app.ai_service import ai_service
 from app.document_processor import document_processor
+from app.embedding_cache import embedding_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,18 +28,18 @@ async def process_existing_documents():
         await db_manager.initialize()
         
         # Get all documents with pending status
-        pending_docs = db_manager.client.table("documents").select("*").eq("processing_status", "pending").execute()
+        pending_docs = await db_manager.get_documents_by_status("pending")
         
-        if not pending_docs.data:
+        if not pending_docs:
             print("No pending documents found to process!")
             return
             
-        print(f"Found {len(pending_docs.data)} pending documents to process")
+        print(f"Found {len(pending_docs)} pending documents to process")
         
         processed_count = 0
         failed_count = 0
         
-        for doc in pending_docs.data:
+        for doc in pending_docs:
             doc_id = doc["id"]
             title = doc["title"]
             
@@ -99,6 +100,9 @@ async def process_existing_documents():
         print(f"  - Failed: {failed_count}")
         print(f"  - Total: {processed_count + failed_count}")
         
+        cache_stats = embedding_cache.stats()
+        print(f"  - Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        
     except Exception as e:
         logger.error(f"Error during processing: {e}")
         import traceback
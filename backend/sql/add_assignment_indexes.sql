@@ -0,0 +1,8 @@
+-- Indexes for per-user assignment lookups
+-- Assignment listings filter on assignee_id (the user's UUID) and sort by
+-- created_at; single-assignment fetches filter on id (the primary key) plus
+-- assignee_id as the access check. Without an index on assignee_id every listing
+-- scans the whole assignments table.
+
+CREATE INDEX IF NOT EXISTS idx_assignments_assignee_created
+ON assignments(assignee_id, created_at DESC);
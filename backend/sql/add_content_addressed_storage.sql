@@ -0,0 +1,44 @@
+-- Reuse of extraction and embeddings across identical uploads
+-- Uploads are stored once per SHA-256 (see app/storage.py) and documents.content_hash
+-- records which stored file a document points at. When a file with the same hash has
+-- already been processed, ingestion copies its extracted text and embedded chunks to
+-- the new document instead of extracting and embedding it again. The copy runs inside
+-- the database, so no embeddings cross the wire.
+-- Requires sql/add_document_content_hash.sql (whose index serves the hash lookups).
+
+-- Copy content and chunks from one document to another
+--   metadata_patch is merged into each copied chunk's metadata (filename, uploader, ...).
+--   Returns the number of chunks copied.
+CREATE OR REPLACE FUNCTION clone_document_content(
+    source_document_id uuid,
+    target_document_id uuid,
+    metadata_patch jsonb DEFAULT '{}'
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    copied integer;
+BEGIN
+    UPDATE documents
+    SET content = source.content
+    FROM documents source
+    WHERE documents.id = target_document_id
+      AND source.id = source_document_id;
+
+    INSERT INTO document_chunks (document_id, content, chunk_index, token_count, embedding, metadata)
+    SELECT
+        target_document_id,
+        dc.content,
+        dc.chunk_index,
+        dc.token_count,
+        dc.embedding,
+        dc.metadata || metadata_patch
+    FROM document_chunks dc
+    WHERE dc.document_id = source_document_id
+    ORDER BY dc.chunk_index;
+
+    GET DIAGNOSTICS copied = ROW_COUNT;
+    RETURN copied;
+END;
+$$;
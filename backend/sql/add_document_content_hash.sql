@@ -0,0 +1,6 @@
+-- Store the SHA-256 of each uploaded file, computed while the upload is streamed to disk
+
+ALTER TABLE documents
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
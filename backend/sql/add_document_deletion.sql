@@ -0,0 +1,32 @@
+-- Background document deletion (see app/deletion.py)
+-- Documents are marked 'deleting' while their chunks are removed in batches, so the
+-- status check has to allow it. Each batch is one RPC that deletes up to batch_size
+-- chunks server-side and returns how many it removed, instead of sending the chunk
+-- IDs back in the request URL.
+-- The search functions skip 'deleting' documents: re-run sql/optimize_vector_search.sql,
+-- sql/add_keyword_search.sql and sql/add_multi_query_search.sql after this migration.
+
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_processing_status_check;
+ALTER TABLE documents ADD CONSTRAINT documents_processing_status_check
+CHECK (processing_status IN ('pending', 'processing', 'completed', 'failed', 'deleting'));
+
+CREATE OR REPLACE FUNCTION delete_document_chunks_batch(
+    target_document_id uuid,
+    batch_size int DEFAULT 500
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    deleted integer;
+BEGIN
+    DELETE FROM document_chunks
+    WHERE id IN (
+        SELECT id FROM document_chunks
+        WHERE document_id = target_document_id
+        LIMIT batch_size
+    );
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    RETURN deleted;
+END;
+$$;
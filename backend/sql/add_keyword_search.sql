@@ -0,0 +1,62 @@
+-- Index-backed keyword search over document chunks
+-- Keyword search used ILIKE '%query%' (a sequential scan of every chunk), then one
+-- more scan per query word when the phrase found nothing. This migration adds a
+-- stored tsvector with a GIN index and a function that matches any query term and
+-- ranks chunks by how well they match, in a single call.
+
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS content_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_content_tsv
+ON document_chunks USING gin (content_tsv);
+
+-- Ranked keyword search
+--   Terms are OR-ed, so chunks matching more (and rarer) terms rank higher.
+--   rank is ts_rank_cd normalized into [0, 1) (normalization flag 32).
+CREATE OR REPLACE FUNCTION search_document_chunks_ranked(
+    query_text text,
+    match_count int DEFAULT 10,
+    filter_document_ids uuid[] DEFAULT NULL
+)
+RETURNS TABLE(
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index integer,
+    metadata jsonb,
+    rank float,
+    document_title text,
+    document_file_type text
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    terms tsquery;
+BEGIN
+    -- plainto_tsquery AND-s the terms; turn that into OR so partial matches count
+    terms := replace(plainto_tsquery('english', query_text)::text, ' & ', ' | ')::tsquery;
+    IF terms IS NULL OR numnode(terms) = 0 THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.content,
+        dc.chunk_index,
+        dc.metadata,
+        ts_rank_cd(dc.content_tsv, terms, 32)::float AS rank,
+        d.title AS document_title,
+        d.file_type AS document_file_type
+    FROM document_chunks dc
+    JOIN documents d ON d.id = dc.document_id
+    WHERE dc.content_tsv @@ terms
+      AND (filter_document_ids IS NULL OR dc.document_id = ANY(filter_document_ids))
+      AND d.processing_status IS DISTINCT FROM 'deleting'
+    ORDER BY rank DESC
+    LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,63 @@
+-- Vector search for several query embeddings in one call
+-- Callers with more than one query (e.g. assignment insights searching by title and
+-- by description) made one RPC per query. This function runs the same index-backed
+-- nearest-neighbour scan as match_document_chunks_v2 once per query, inside a single
+-- round trip, and tags each hit with the position of the query it answers.
+-- Requires sql/optimize_vector_search.sql.
+
+CREATE OR REPLACE FUNCTION match_document_chunks_multi(
+    query_embeddings vector(1536)[],
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 10,
+    ef_search int DEFAULT 40,
+    probes int DEFAULT 10
+)
+RETURNS TABLE(
+    query_index integer,
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index integer,
+    metadata jsonb,
+    similarity float,
+    document_title text,
+    document_file_type text
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    PERFORM set_config('ivfflat.probes', probes::text, true);
+
+    RETURN QUERY
+    SELECT
+        (queries.ordinality - 1)::integer AS query_index,
+        nearest.id,
+        nearest.document_id,
+        nearest.content,
+        nearest.chunk_index,
+        nearest.metadata,
+        nearest.similarity,
+        d.title AS document_title,
+        d.file_type AS document_file_type
+    FROM unnest(query_embeddings) WITH ORDINALITY AS queries(embedding, ordinality)
+    CROSS JOIN LATERAL (
+        -- ORDER BY distance + LIMIT per query keeps each scan on the HNSW index
+        SELECT
+            dc.id,
+            dc.document_id,
+            dc.content,
+            dc.chunk_index,
+            dc.metadata,
+            1 - (dc.embedding <=> queries.embedding) AS similarity
+        FROM document_chunks dc
+        ORDER BY dc.embedding <=> queries.embedding
+        LIMIT match_count
+    ) nearest
+    JOIN documents d ON d.id = nearest.document_id
+    WHERE nearest.similarity > match_threshold
+      AND d.processing_status IS DISTINCT FROM 'deleting'
+    ORDER BY query_index, nearest.similarity DESC;
+END;
+$$;
@@ -0,0 +1,20 @@
+-- Persisted AI insights per assignment
+-- Generating insights costs a retrieval pass and an LLM completion. Results are stored
+-- with the assignment's updated_at and the user's document-set version they were built
+-- from; a stored row is served as long as both still match.
+
+CREATE TABLE IF NOT EXISTS assignment_insights (
+    assignment_id UUID NOT NULL REFERENCES assignments(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    assignment_updated_at TIMESTAMP WITH TIME ZONE,
+    documents_version TEXT NOT NULL,
+    insights JSONB NOT NULL,
+    generated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (assignment_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_assignment_insights_user ON assignment_insights(user_id);
+
+-- The document-set version is (completed document count, latest processed_at)
+CREATE INDEX IF NOT EXISTS idx_documents_user_processed
+ON documents(uploaded_by, processing_status, processed_at DESC);
@@ -0,0 +1,35 @@
+-- Assignment counts for a user in one grouped aggregate
+-- The stats endpoint and chat suggestions loaded every assignment (with the projects
+-- join) and counted statuses and priorities in Python. This function returns all the
+-- counts as one row; with idx_assignments_assignee_created (sql/add_assignment_indexes.sql)
+-- it reads only the user's rows. assignee_id is a UUID; comparing it uncast keeps the
+-- lookup on that index.
+
+-- Replaces the earlier text-parameter version, which cast the column and scanned the table
+DROP FUNCTION IF EXISTS get_assignment_stats(text);
+
+CREATE OR REPLACE FUNCTION get_assignment_stats(p_user_id uuid)
+RETURNS TABLE(
+    total_assignments bigint,
+    completed_assignments bigint,
+    in_progress_assignments bigint,
+    pending_assignments bigint,
+    high_priority_assignments bigint,
+    overdue_assignments bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*) AS total_assignments,
+        COUNT(*) FILTER (WHERE status = 'completed') AS completed_assignments,
+        COUNT(*) FILTER (WHERE status = 'in-progress') AS in_progress_assignments,
+        COUNT(*) FILTER (WHERE status = 'todo') AS pending_assignments,
+        COUNT(*) FILTER (WHERE priority = 'high') AS high_priority_assignments,
+        COUNT(*) FILTER (
+            WHERE status IS DISTINCT FROM 'completed'
+              AND NULLIF(due_date::text, '')::timestamptz < NOW()
+        ) AS overdue_assignments
+    FROM assignments
+    WHERE assignee_id = p_user_id;
+$$;
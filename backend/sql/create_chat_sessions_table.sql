@@ -0,0 +1,108 @@
+-- Per-session chat summary maintained by triggers on chat_messages
+-- Listing sessions used to read up to 1000 messages and group them in Python.
+-- chat_sessions keeps one row per (user, session) with the message count,
+-- the first message and the last activity, so listings read one row per session.
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    user_id UUID NOT NULL,
+    session_id TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    first_message TEXT,
+    first_message_at TIMESTAMP WITH TIME ZONE,
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (user_id, session_id)
+);
+
+-- Keyset pagination over a user's sessions, most recent first
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_recent
+ON chat_sessions(user_id, last_message_at DESC, session_id DESC);
+
+-- Session lookups and bulk deletes on the messages table
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_session
+ON chat_messages(user_id, session_id, created_at DESC);
+
+-- Count each new message into its session
+CREATE OR REPLACE FUNCTION chat_sessions_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.session_id IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO chat_sessions (user_id, session_id, message_count, first_message, first_message_at, last_message_at)
+    VALUES (NEW.user_id, NEW.session_id::text, 1, LEFT(NEW.message, 500), NEW.created_at, NEW.created_at)
+    ON CONFLICT (user_id, session_id) DO UPDATE SET
+        message_count = chat_sessions.message_count + 1,
+        first_message = CASE
+            WHEN EXCLUDED.first_message_at < chat_sessions.first_message_at THEN EXCLUDED.first_message
+            ELSE chat_sessions.first_message
+        END,
+        first_message_at = LEAST(chat_sessions.first_message_at, EXCLUDED.first_message_at),
+        last_message_at = GREATEST(chat_sessions.last_message_at, EXCLUDED.last_message_at);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chat_messages_session_insert ON chat_messages;
+CREATE TRIGGER chat_messages_session_insert
+    AFTER INSERT ON chat_messages
+    FOR EACH ROW
+    EXECUTE FUNCTION chat_sessions_on_insert();
+
+-- Subtract deleted messages once per statement, dropping sessions that become empty
+CREATE OR REPLACE FUNCTION chat_sessions_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE chat_sessions s
+    SET message_count = s.message_count - deleted.count
+    FROM (
+        SELECT user_id, session_id::text AS session_id, COUNT(*) AS count
+        FROM deleted_messages
+        WHERE session_id IS NOT NULL
+        GROUP BY user_id, session_id
+    ) deleted
+    WHERE s.user_id = deleted.user_id AND s.session_id = deleted.session_id;
+
+    DELETE FROM chat_sessions s
+    USING (SELECT DISTINCT user_id, session_id::text AS session_id FROM deleted_messages) deleted
+    WHERE s.user_id = deleted.user_id
+      AND s.session_id = deleted.session_id
+      AND s.message_count <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chat_messages_session_delete ON chat_messages;
+CREATE TRIGGER chat_messages_session_delete
+    AFTER DELETE ON chat_messages
+    REFERENCING OLD TABLE AS deleted_messages
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chat_sessions_on_delete();
+
+-- Backfill summaries for existing messages
+INSERT INTO chat_sessions (user_id, session_id, message_count, first_message, first_message_at, last_message_at)
+SELECT
+    counts.user_id,
+    counts.session_id,
+    counts.message_count,
+    LEFT(firsts.message, 500),
+    counts.first_message_at,
+    counts.last_message_at
+FROM (
+    SELECT user_id, session_id::text AS session_id, COUNT(*) AS message_count,
+           MIN(created_at) AS first_message_at, MAX(created_at) AS last_message_at
+    FROM chat_messages
+    WHERE session_id IS NOT NULL
+    GROUP BY user_id, session_id
+) counts
+JOIN (
+    SELECT DISTINCT ON (user_id, session_id) user_id, session_id::text AS session_id, message
+    FROM chat_messages
+    WHERE session_id IS NOT NULL
+    ORDER BY user_id, session_id, created_at
+) firsts ON firsts.user_id = counts.user_id AND firsts.session_id = counts.session_id
+ON CONFLICT (user_id, session_id) DO UPDATE SET
+    message_count = EXCLUDED.message_count,
+    first_message = EXCLUDED.first_message,
+    first_message_at = EXCLUDED.first_message_at,
+    last_message_at = EXCLUDED.last_message_at;
@@ -0,0 +1,31 @@
+-- Log of deleted documents, for local vector indexes to sync deletions
+-- Local indexes (VECTOR_SEARCH_BACKEND=local) pull new chunks by created_at, so a
+-- document deleted by another process stayed searchable in them. Deleting a document
+-- now appends its ID here; indexes read the log after their last seen ID and drop
+-- the document's chunks.
+
+CREATE TABLE IF NOT EXISTS deleted_documents (
+    id BIGSERIAL PRIMARY KEY,
+    document_id UUID NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Record deleted documents once per statement
+CREATE OR REPLACE FUNCTION documents_log_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO deleted_documents (document_id)
+    SELECT id FROM removed_documents;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_log_delete ON documents;
+CREATE TRIGGER documents_log_delete
+    AFTER DELETE ON documents
+    REFERENCING OLD TABLE AS removed_documents
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION documents_log_delete();
+
+-- Entries older than every index's last sync can be pruned, e.g.
+--   DELETE FROM deleted_documents WHERE deleted_at < NOW() - INTERVAL '30 days';
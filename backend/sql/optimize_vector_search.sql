@@ -0,0 +1,77 @@
+-- Index-friendly vector search with tunable recall
+-- The existing functions filter on 1 - (embedding <=> query) > threshold, which stops
+-- the planner from using the vector index, so every search scans all chunks.
+-- This migration switches to an HNSW index and adds a search function that orders by
+-- the distance operator with LIMIT (an index scan) and applies the threshold afterwards.
+
+-- Replace the ivfflat index with HNSW (pgvector >= 0.5.0)
+DROP INDEX IF EXISTS idx_document_chunks_embedding;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_hnsw
+ON document_chunks USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Nearest-neighbour search with per-query recall settings
+--   ef_search: HNSW candidate list size (higher = better recall, slower)
+--   probes:    ivfflat lists probed, only used if an ivfflat index is in place
+CREATE OR REPLACE FUNCTION match_document_chunks_v2(
+    query_embedding vector(1536),
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 10,
+    ef_search int DEFAULT 40,
+    probes int DEFAULT 10,
+    filter_document_ids uuid[] DEFAULT NULL
+)
+RETURNS TABLE(
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index integer,
+    metadata jsonb,
+    similarity float,
+    document_title text,
+    document_file_type text
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    -- Transaction-local, so each RPC call gets its own setting
+    PERFORM set_config('hnsw.ef_search', ef_search::text, true);
+    PERFORM set_config('ivfflat.probes', probes::text, true);
+
+    RETURN QUERY
+    SELECT
+        nearest.id,
+        nearest.document_id,
+        nearest.content,
+        nearest.chunk_index,
+        nearest.metadata,
+        nearest.similarity,
+        d.title AS document_title,
+        d.file_type AS document_file_type
+    FROM (
+        SELECT
+            dc.id,
+            dc.document_id,
+            dc.content,
+            dc.chunk_index,
+            dc.metadata,
+            1 - (dc.embedding <=> query_embedding) AS similarity
+        FROM document_chunks dc
+        WHERE filter_document_ids IS NULL OR dc.document_id = ANY(filter_document_ids)
+        ORDER BY dc.embedding <=> query_embedding
+        LIMIT match_count
+    ) nearest
+    JOIN documents d ON d.id = nearest.document_id
+    WHERE nearest.similarity > match_threshold
+      AND d.processing_status IS DISTINCT FROM 'deleting'
+    ORDER BY nearest.similarity DESC;
+END;
+$$;
+
+-- Check the new plan uses the index (look for "Index Scan using idx_document_chunks_embedding_hnsw")
+-- EXPLAIN ANALYZE
+-- SELECT id FROM document_chunks
+-- ORDER BY embedding <=> (SELECT embedding FROM document_chunks LIMIT 1)
+-- LIMIT 10;